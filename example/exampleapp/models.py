@@ -2,10 +2,8 @@ from django.core.urlresolvers import reverse
 from django.db import models
 
 from jsonattrs.fields import JSONAttributeField
-from jsonattrs.decorators import fix_model_for_attributes
 
 
-@fix_model_for_attributes
 class Division(models.Model):
     name = models.CharField(max_length=100)
     attrs = JSONAttributeField()
@@ -17,7 +15,6 @@ class Division(models.Model):
         return self.name
 
 
-@fix_model_for_attributes
 class Department(models.Model):
     name = models.CharField(max_length=100)
     division = models.ForeignKey(Division, related_name='departments')
@@ -30,7 +27,6 @@ class Department(models.Model):
         return self.name
 
 
-@fix_model_for_attributes
 class Party(models.Model):
     department = models.ForeignKey(Department, related_name='parties')
     name = models.CharField(max_length=100)
@@ -46,7 +42,6 @@ class Party(models.Model):
         return self.name
 
 
-@fix_model_for_attributes
 class Contract(models.Model):
     department = models.ForeignKey(Department, related_name='contracts')
     responsible = models.ForeignKey(Party)
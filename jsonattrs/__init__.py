@@ -1 +1,3 @@
 __version__ = '0.1.26'
+
+default_app_config = 'jsonattrs.apps.JSONAttrsConfig'
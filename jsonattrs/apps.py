@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+
+class JSONAttrsConfig(AppConfig):
+    name = 'jsonattrs'
+
+    def ready(self):
+        from .selectors import load_selector_config
+        load_selector_config()
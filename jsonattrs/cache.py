@@ -0,0 +1,209 @@
+from collections import OrderedDict
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+
+
+# Schema and composed schema lookups go through two cache tiers: an
+# optional, size-bounded LRU cache local to the process, in front of the
+# shared "jsonattrs" cache backend.  The local tier is enabled by setting
+# JSONATTRS_LOCAL_CACHE_SIZE to the maximum number of entries to keep.
+#
+# Cache keys include a per-content type schema generation, so the local
+# tier stays coherent as long as generations are fresh.  When the local
+# tier is enabled, generations read from the shared backend are trusted
+# for JSONATTRS_LOCAL_CACHE_TTL seconds, which bounds how long a process
+# can serve schemata that another process has changed.
+
+
+class LocalCache:
+    """
+    Thread-safe LRU cache.  Values are stored as-is, without pickling, so
+    they are shared between callers and must be treated as read-only.
+    """
+    def __init__(self):
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value, max_size):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > max_size:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+local_cache = LocalCache()
+local_generations = dict()
+
+# Composed schemata are always memoised in the process, keyed by their
+# versioned compose cache key.  The memo holds copies whose attributes are
+# detached from the schema instances they were built from, since those
+# are modified when their attributes are prefetched again.
+composed_cache = LocalCache()
+
+# Selector values that need a join to compute are memoised in the process,
+# keyed by the related model, its key and the lookup path.  Entries are
+# dropped when an instance of a model along the path is saved or deleted
+# in this process, and expire after JSONATTRS_SELECTOR_CACHE_TTL seconds,
+# which bounds how long changes made by other processes or by
+# QuerySet.update() can go unseen.
+selector_cache = LocalCache()
+
+
+def local_cache_size():
+    return getattr(settings, 'JSONATTRS_LOCAL_CACHE_SIZE', 0)
+
+
+def local_cache_ttl():
+    return getattr(settings, 'JSONATTRS_LOCAL_CACHE_TTL', 1.0)
+
+
+def composed_cache_size():
+    return getattr(settings, 'JSONATTRS_COMPOSED_CACHE_SIZE', 1000)
+
+
+def selector_cache_size():
+    return getattr(settings, 'JSONATTRS_SELECTOR_CACHE_SIZE', 10000)
+
+
+def selector_cache_ttl():
+    return getattr(settings, 'JSONATTRS_SELECTOR_CACHE_TTL', 1.0)
+
+
+def cache_get(key):
+    size = local_cache_size()
+    if size:
+        value = local_cache.get(key)
+        if value is not None:
+            return value
+    value = caches['jsonattrs'].get(key)
+    if size and value is not None:
+        local_cache.set(key, value, size)
+    return value
+
+
+def cache_get_many(keys):
+    size = local_cache_size()
+    values = {}
+    if size:
+        for key in keys:
+            value = local_cache.get(key)
+            if value is not None:
+                values[key] = value
+    missing = [key for key in keys if key not in values]
+    if missing:
+        shared = caches['jsonattrs'].get_many(missing)
+        if size:
+            for key, value in shared.items():
+                local_cache.set(key, value, size)
+        values.update(shared)
+    return values
+
+
+def cache_set(key, value):
+    caches['jsonattrs'].set(key, value)
+    size = local_cache_size()
+    if size:
+        local_cache.set(key, value, size)
+
+
+def cache_set_many(values):
+    if not values:
+        return
+    caches['jsonattrs'].set_many(values)
+    size = local_cache_size()
+    if size:
+        for key, value in values.items():
+            local_cache.set(key, value, size)
+
+
+def cache_clear():
+    caches['jsonattrs'].clear()
+    local_cache.clear()
+    local_generations.clear()
+    composed_cache.clear()
+    selector_cache.clear()
+
+
+def generation_cache_key(content_type_id):
+    return 'jsonattrs:generation:' + str(content_type_id)
+
+
+def schema_generation(content_type_id):
+    """
+    Returns the current schema generation for a content type.  The
+    generation is part of every cache key for the content type's schemata,
+    so bumping it invalidates just those entries and leaves stale ones to
+    expire from the cache on their own.
+    """
+    return schema_generations([content_type_id])[content_type_id]
+
+
+def schema_generations(content_type_ids):
+    """
+    Returns a map from content type IDs to their current schema
+    generations, reading all of them in one cache round trip.
+    """
+    generations = {}
+    local = local_cache_size() > 0
+    if local:
+        now = time.monotonic()
+        ttl = local_cache_ttl()
+        for content_type_id in content_type_ids:
+            generation, fetched = local_generations.get(content_type_id,
+                                                        (None, None))
+            if fetched is not None and now - fetched < ttl:
+                generations[content_type_id] = generation
+
+    missing = {generation_cache_key(ct): ct
+               for ct in content_type_ids if ct not in generations}
+    if not missing:
+        return generations
+
+    cache = caches['jsonattrs']
+    found = cache.get_many(list(missing))
+    for key, content_type_id in missing.items():
+        generation = found.get(key)
+        if generation is None:
+            # Seed from the clock so that a counter evicted from the cache
+            # never restarts at a generation that has been used before.
+            generation = int(time.time() * 1000)
+            if not cache.add(key, generation, timeout=None):
+                generation = cache.get(key, generation)
+        generations[content_type_id] = generation
+        if local:
+            local_generations[content_type_id] = (generation,
+                                                  time.monotonic())
+    return generations
+
+
+def bump_schema_generation(content_type_id):
+    cache = caches['jsonattrs']
+    key = generation_cache_key(content_type_id)
+    try:
+        generation = cache.incr(key)
+    except ValueError:
+        generation = int(time.time() * 1000)
+        cache.set(key, generation, timeout=None)
+
+    # Changes made by this process are visible to it immediately.
+    if local_cache_size() > 0:
+        local_generations[content_type_id] = (generation, time.monotonic())
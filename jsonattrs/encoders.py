@@ -0,0 +1,156 @@
+import json
+import math
+import re
+from datetime import date, datetime
+from decimal import Decimal
+from uuid import UUID
+
+from django.conf import settings
+from django.core.signals import setting_changed
+from django.utils.module_loading import import_string
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+# JSON encoder backends used to serialise attribute values for the
+# database.  JSONATTRS_JSON_ENCODER selects one by name ("json" or
+# "orjson") or as a dotted path to a dumps function taking a value and a
+# "default" function for unsupported types, and returning a str.  By
+# default the orjson backend is used when orjson is installed, and the
+# standard library's json module otherwise.  All backends produce
+# equivalent JSON: dates and datetimes are written in ISO 8601 format by
+# convert(), Decimals as numbers and UUIDs as strings.  Other types, such
+# as times, are rejected with a TypeError, and non-finite numbers (which
+# JSON cannot represent) with a ValueError.
+#
+# Decimals are converted to floats unless JSONATTRS_EXACT_DECIMALS is set,
+# in which case they are written exactly, as their string representation.
+# Backends write each Decimal as a marker string, which is then replaced
+# by the number: markers start and end with NUL characters, which cannot
+# occur in jsonb strings, so they never clash with real values.  In this
+# mode, non-integral numbers are also decoded as Decimals.
+
+
+def exact_decimals():
+    return getattr(settings, 'JSONATTRS_EXACT_DECIMALS', False)
+
+
+NON_FINITE_MESSAGE = 'Out of range float values are not JSON compliant'
+
+
+def convert(val):
+    # This is needed to provide JSON serialisation for date objects
+    # whenever they're saved to JSON attribute fields.  This function is
+    # passed as the custom "dumps" method for psycopg2's Json class to
+    # use.
+    if isinstance(val, datetime) or isinstance(val, date):
+        return val.isoformat()
+    elif isinstance(val, Decimal):
+        if not val.is_finite():
+            raise ValueError(NON_FINITE_MESSAGE)
+        return float(val)
+    elif isinstance(val, UUID):
+        return str(val)
+    else:
+        raise TypeError(
+            "{} can not be converted to JSON.".format(type(val).__name__))
+
+
+def mark_decimal(val):
+    if isinstance(val, Decimal) and val.is_finite():
+        return '\x00D' + str(val) + '\x00'
+    return convert(val)
+
+
+DECIMAL_MARKER_RE = re.compile(r'"\\u0000D([-+.0-9Ee]+)\\u0000"')
+
+
+def exact_decimal_dumps(dumps):
+    """
+    Wraps a backend's dumps function to write Decimals exactly.
+    """
+    def exact_dumps(obj):
+        encoded = dumps(obj, default=mark_decimal)
+        if '\\u0000D' in encoded:
+            encoded = DECIMAL_MARKER_RE.sub(r'\1', encoded)
+        return encoded
+    return exact_dumps
+
+
+def _check_finite(obj):
+    # orjson writes non-finite floats as null, where json raises.
+    if isinstance(obj, float):
+        if not math.isfinite(obj):
+            raise ValueError(NON_FINITE_MESSAGE)
+    elif isinstance(obj, dict):
+        for value in obj.values():
+            _check_finite(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            _check_finite(value)
+
+
+def json_dumps(obj, default=convert):
+    return json.dumps(obj, default=default, allow_nan=False)
+
+
+def orjson_dumps(obj, default=convert):
+    _check_finite(obj)
+    try:
+        # Dates and datetimes go through the default function, so that
+        # they are written the same way by both backends.
+        return orjson.dumps(
+            obj, default=default,
+            option=orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        ).decode('utf-8')
+    except orjson.JSONEncodeError:
+        # E.g. integers outside the 64-bit range, which orjson rejects.
+        return json_dumps(obj, default=default)
+
+
+def json_loads(value):
+    if exact_decimals():
+        return json.loads(value, parse_float=Decimal)
+    return json.loads(value)
+
+
+BACKENDS = {
+    'json': json_dumps,
+    'orjson': orjson_dumps,
+}
+
+_dumps = None
+
+
+def get_encoder():
+    """
+    Returns the dumps function of the configured JSON encoder backend.
+    """
+    global _dumps
+    if _dumps is None:
+        name = getattr(settings, 'JSONATTRS_JSON_ENCODER', None)
+        if name is None:
+            name = 'json' if orjson is None else 'orjson'
+        if name == 'orjson' and orjson is None:
+            raise ImportError('JSONATTRS_JSON_ENCODER is "orjson", but '
+                              'orjson is not installed')
+        _dumps = BACKENDS.get(name) or import_string(name)
+        if exact_decimals():
+            _dumps = exact_decimal_dumps(_dumps)
+    return _dumps
+
+
+def json_serialiser(obj):
+    return get_encoder()(obj)
+
+
+def _encoder_setting_changed(setting, **kwargs):
+    global _dumps
+    if setting in ('JSONATTRS_JSON_ENCODER', 'JSONATTRS_EXACT_DECIMALS'):
+        _dumps = None
+
+
+setting_changed.connect(_encoder_setting_changed)
@@ -0,0 +1,343 @@
+from collections import namedtuple
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .exceptions import SchemaUpdateConflict
+from .fields import types_compatible
+from .models import AttributeType, Schema, composed_schema
+from .selectors import selector_config
+from .transforms import TYPED_CASTS
+
+
+# Set-based changes to the attribute data of the rows a schema applies to,
+# for use alongside changes to the schema's attribute definitions (e.g.
+# in data migrations).  The rows are those whose selectors start with the
+# schema's selectors; each change is written with one UPDATE per chunk of
+# rows, computed entirely in SQL.  Rows whose values conflict with a
+# change are left alone and counted.  With dry_run=True, nothing is
+# written and the counts come from a single aggregate query.  Schemata
+# whose selectors cannot match any row have nothing to change.
+
+ChangeResult = namedtuple('ChangeResult', ('affected', 'conflicts'))
+
+# The number of rows with a conflict, and the primary keys of some of them.
+ConflictCount = namedtuple('ConflictCount', ('conflict', 'count', 'samples'))
+
+DEFAULT_CHUNK_SIZE = 5000
+
+# A change to the attributes of a row, as SQL templates on the attribute
+# column ("{col}"), each with its parameters: the condition for rows to
+# change, the condition for rows that conflict with the change (a subset
+# of those rows), and the new attribute value.
+AttributeChange = namedtuple('AttributeChange',
+                             ('condition', 'conflict', 'expression'))
+
+# Conversions of text values to other attribute types: a pattern that
+# values must match (or None), the typed cast that they must parse with,
+# and the SQL expression giving the converted JSON value from the text
+# ("{value}") and typed ("{typed}") values.  Dates and datetimes stay
+# text, in ISO 8601 format.
+RETYPE_CONVERSIONS = {
+    'integer': (r'^\s*[-+]?\d+\s*$', 'int', 'to_jsonb({typed})'),
+    'decimal': (r'^\s*[-+]?\d+(\.\d+)?\s*$', 'dec', 'to_jsonb({typed})'),
+    'boolean': (r'^(true|false|True|False)$', 'bool', 'to_jsonb({typed})'),
+    'date': (None, 'date', 'to_jsonb({value})'),
+    'dateTime': (None, 'datetime', 'to_jsonb({value})'),
+}
+
+# Attribute types whose values are lists.
+LIST_TYPES = frozenset(('select_multiple',))
+
+
+def schema_queryset(schema, using=DEFAULT_DB_ALIAS):
+    """
+    Returns a queryset of the rows that a schema applies to, i.e. those
+    whose selector values start with the schema's selectors.
+    """
+    content_type = ContentType.objects.get_for_id(schema.content_type_id)
+    model = content_type.model_class()
+    paths = selector_config().paths.get(
+        (content_type.app_label, content_type.model), ()
+    )
+    if len(schema.selectors) > len(paths):
+        return model._base_manager.using(using).none()
+    filters = {path.replace('.', '__'): value
+               for path, value in zip(paths, schema.selectors)}
+    return model._base_manager.using(using).filter(**filters)
+
+
+def _schema_sql(schema, using):
+    # The quoted table, primary key and attribute column names of a
+    # schema's model, and the SQL for the primary keys of its rows, or
+    # None if it has no rows.
+    queryset = schema_queryset(schema, using)
+    model = queryset.model
+    qn = connections[using].ops.quote_name
+    try:
+        scope_sql, scope_params = (queryset.values('pk').query
+                                   .sql_with_params())
+    except EmptyResultSet:
+        return None
+    return (qn(model._meta.db_table), qn(model._meta.pk.column),
+            qn(model._meta.get_field(model._attr_field_name).column),
+            scope_sql, list(scope_params))
+
+
+def apply_change(schema, change, dry_run=False,
+                 chunk_size=DEFAULT_CHUNK_SIZE, using=DEFAULT_DB_ALIAS):
+    """
+    Applies an AttributeChange to the rows a schema applies to, returning
+    a ChangeResult with the numbers of changed (or, for a dry run, to be
+    changed) and conflicting rows.
+    """
+    connection = connections[using]
+    scope = _schema_sql(schema, using)
+    if scope is None:
+        return ChangeResult(0, 0)
+    table, pk, col, scope_sql, scope_params = scope
+
+    condition, condition_params = change.condition
+    conflict, conflict_params = change.conflict
+    expression, expression_params = change.expression
+    condition = condition.format(col=col)
+    conflict = conflict.format(col=col)
+    expression = expression.format(col=col)
+
+    with connection.cursor() as cursor:
+        if dry_run:
+            cursor.execute(
+                'SELECT count(*) FILTER (WHERE ({cond}) AND NOT ({conf})), '
+                'count(*) FILTER (WHERE ({cond}) AND ({conf})) '
+                'FROM {table} WHERE {pk} IN ({scope})'.format(
+                    cond=condition, conf=conflict, table=table, pk=pk,
+                    scope=scope_sql
+                ),
+                (list(condition_params) + list(conflict_params) +
+                 list(condition_params) + list(conflict_params) +
+                 list(scope_params))
+            )
+            return ChangeResult(*cursor.fetchone())
+
+        cursor.execute(
+            'SELECT count(*) FROM {table} WHERE {pk} IN ({scope}) '
+            'AND ({cond}) AND ({conf})'.format(
+                table=table, pk=pk, scope=scope_sql, cond=condition,
+                conf=conflict
+            ),
+            list(scope_params) + list(condition_params) + list(conflict_params)
+        )
+        conflicts = cursor.fetchone()[0]
+
+        affected = 0
+        last = None
+        while True:
+            after = '' if last is None else 'AND {} > %s '.format(pk)
+            with transaction.atomic(using=using):
+                cursor.execute(
+                    'UPDATE {table} SET {col} = {expr} WHERE {pk} IN ('
+                    'SELECT {pk} FROM {table} WHERE {pk} IN ({scope}) '
+                    'AND ({cond}) AND NOT ({conf}) {after}'
+                    'ORDER BY {pk} LIMIT %s) RETURNING {pk}'.format(
+                        table=table, col=col, expr=expression, pk=pk,
+                        scope=scope_sql, cond=condition, conf=conflict,
+                        after=after
+                    ),
+                    (list(expression_params) + list(scope_params) +
+                     list(condition_params) + list(conflict_params) +
+                     ([] if last is None else [last]) + [chunk_size])
+                )
+                changed = [row[0] for row in cursor.fetchall()]
+            if not changed:
+                break
+            affected += len(changed)
+            last = max(changed)
+    return ChangeResult(affected, conflicts)
+
+
+def rename_attribute(schema, old_name, new_name, **kwargs):
+    """
+    Renames an attribute in the rows a schema applies to.  Rows that
+    already have a value for the new name conflict.
+    """
+    change = AttributeChange(
+        ('{col} ? %s', [old_name]),
+        ('{col} ? %s', [new_name]),
+        ('({col} - %s) || jsonb_build_object(%s::text, {col} -> %s)',
+         [old_name, new_name, old_name]),
+    )
+    return apply_change(schema, change, **kwargs)
+
+
+def retype_attribute(schema, name, attr_type, choices=None, **kwargs):
+    """
+    Converts the values of an attribute to the JSON representation of a
+    new attribute type (an AttributeType or its name) in the rows a schema
+    applies to, e.g. scalars to lists for multiple choices.  Values that
+    cannot be converted conflict, as do values outside ``choices`` if it is
+    given; empty values are left alone.
+    """
+    if isinstance(attr_type, AttributeType):
+        attr_type = attr_type.name
+    value = '({col} ->> %s)'
+    if attr_type in LIST_TYPES:
+        # Scalars become one-element lists.
+        expression = ("CASE WHEN jsonb_typeof({{col}} -> %s) = 'array' "
+                      "THEN {{col}} -> %s ELSE jsonb_build_array({}) "
+                      "END".format(value))
+        expression_params = [name, name, name]
+        conflicts = [("jsonb_typeof({col} -> %s) = 'object'", [name])]
+        if choices is not None:
+            conflicts.append((
+                'EXISTS (SELECT 1 FROM jsonb_array_elements_text({}) '
+                'WHERE value <> ALL(%s))'.format(expression),
+                expression_params + [list(choices)]
+            ))
+    else:
+        conflicts = [("jsonb_typeof({col} -> %s) IN ('array', 'object')",
+                      [name])]
+        if attr_type in RETYPE_CONVERSIONS:
+            pattern, cast, template = RETYPE_CONVERSIONS[attr_type]
+            typed = TYPED_CASTS[cast].template.format(value)
+            conflicts.append(('{} IS NULL'.format(typed), [name]))
+            if pattern is not None:
+                conflicts.append(('{} !~ %s'.format(value), [name, pattern]))
+            expression = template.format(value=value, typed=typed)
+        else:
+            expression = 'to_jsonb({})'.format(value)
+        expression_params = [name]
+        if choices is not None:
+            conflicts.append(('{} <> ALL(%s)'.format(value),
+                              [name, list(choices)]))
+    change = AttributeChange(
+        ("{col} ? %s AND {col} ->> %s <> ''", [name, name]),
+        (' OR '.join('({})'.format(c) for c, _ in conflicts),
+         [p for _, params in conflicts for p in params]),
+        ('{{col}} || jsonb_build_object(%s::text, {})'.format(expression),
+         [name] + expression_params),
+    )
+    return apply_change(schema, change, **kwargs)
+
+
+def drop_attribute(schema, name, **kwargs):
+    """
+    Removes an attribute from the rows a schema applies to.
+    """
+    change = AttributeChange(
+        ('{col} ? %s', [name]),
+        ('false', []),
+        ('{col} - %s', [name]),
+    )
+    return apply_change(schema, change, **kwargs)
+
+
+def fill_default(schema, name, default, **kwargs):
+    """
+    Sets an attribute to a default value in the rows a schema applies to
+    where it is missing or empty, e.g. when adding a required attribute.
+    """
+    change = AttributeChange(
+        ("{col} IS NULL OR NOT {col} ? %s OR {col} ->> %s = ''",
+         [name, name]),
+        ('false', []),
+        ("COALESCE({col}, '{{}}'::jsonb) || jsonb_build_object(%s::text, "
+         "%s::text)", [name, default]),
+    )
+    return apply_change(schema, change, **kwargs)
+
+
+def _conflict_checks(old_attrs, new_attrs, strict):
+    # SQL conditions for the rows that each conflict of a proposed
+    # attribute set applies to, following JSONAttributes'
+    # _attr_list_conflicts.
+    present = "{col} ? %s AND {col} ->> %s <> ''"
+    for name, attr in new_attrs.items():
+        if name not in old_attrs:
+            if attr.required and not attr.default:
+                yield (SchemaUpdateConflict(name, 'required_no_default'),
+                       "{col} IS NULL OR NOT {col} ? %s OR "
+                       "{col} ->> %s = ''", [name, name])
+            continue
+        old = old_attrs[name]
+        if not types_compatible(attr.attr_type, old.attr_type, None):
+            yield (SchemaUpdateConflict(name, 'incompatible_type'),
+                   present, [name, name])
+        if strict and attr.choices:
+            yield (SchemaUpdateConflict(name, 'incompatible_choices'),
+                   present + ' AND NOT ({col} -> %s) <@ to_jsonb(%s::text[])',
+                   [name, name, name, list(attr.choices)])
+
+
+def analyse_conflicts(schema, attributes, strict=True, samples=5,
+                      using=DEFAULT_DB_ALIAS):
+    """
+    Reports the existing rows that a proposed set of attributes for a
+    schema would conflict with, comparing the attributes composed with
+    those of the schema's parent schemata (the schemata for prefixes of its
+    selectors) before and after the change: rows missing new required
+    attributes without defaults,
+    rows with values for attributes whose type changes incompatibly and,
+    if ``strict``, rows with values outside changed choices.  Returns a
+    list of ConflictCount tuples for the conflicts that some rows have,
+    using one aggregate query and one query for sample primary keys.
+    """
+    content_type = ContentType.objects.get_for_id(schema.content_type_id)
+    key = (content_type, tuple(schema.selectors))
+    schemas = Schema.objects.db_manager(using).lookup_selectors(
+        [key]
+    ).get(key, [schema])
+    parents = [s for s in schemas if s.pk != schema.pk]
+    old_attrs = composed_schema(*schemas).attributes
+    new_attrs = dict(composed_schema(*parents).attributes if parents
+                     else {})
+    for attr in attributes:
+        if attr.omit:
+            new_attrs.pop(attr.name, None)
+        else:
+            new_attrs[attr.name] = attr
+    checks = list(_conflict_checks(old_attrs, new_attrs, strict))
+    if not checks:
+        return []
+
+    scope = _schema_sql(schema, using)
+    if scope is None:
+        return []
+    table, pk, col, scope_sql, scope_params = scope
+    counts = []
+    params = []
+    for _, condition, condition_params in checks:
+        counts.append('count(*) FILTER (WHERE {})'.format(
+            condition.format(col=col)
+        ))
+        params.extend(condition_params)
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            'SELECT {} FROM {} WHERE {} IN ({})'.format(
+                ', '.join(counts), table, pk, scope_sql
+            ),
+            params + scope_params
+        )
+        found = [(check, count) for check, count
+                 in zip(checks, cursor.fetchone()) if count]
+        if not found:
+            return []
+
+        queries = []
+        params = []
+        for i, ((_, condition, condition_params), _) in enumerate(found):
+            queries.append(
+                '(SELECT {i}, {pk} FROM {table} WHERE {pk} IN ({scope}) '
+                'AND ({cond}) ORDER BY {pk} LIMIT %s)'.format(
+                    i=i, pk=pk, table=table, scope=scope_sql,
+                    cond=condition.format(col=col)
+                )
+            )
+            params.extend(scope_params + list(condition_params) + [samples])
+        cursor.execute(' UNION ALL '.join(queries), params)
+        sample_pks = [[] for _ in found]
+        for i, row_pk in cursor.fetchall():
+            sample_pks[i].append(row_pk)
+
+    return [ConflictCount(check[0], count, sample_pks[i])
+            for i, (check, count) in enumerate(found)]
@@ -39,3 +39,25 @@ class SchemaUpdateException(Exception):
 
     def __repr__(self):
         return str(self)
+
+
+class BulkValidationException(Exception):
+    """
+    Raised by bulk operations when some objects' attributes are invalid.
+    ``errors`` maps the positions of the invalid objects to lists of error
+    messages.
+    """
+    def __init__(self, *args, **kwargs):
+        self.errors = kwargs.pop('errors', {})
+        super().__init__(*args, **kwargs)
+
+    @property
+    def messages(self):
+        return ['Object {}: {}'.format(i, m)
+                for i, msgs in sorted(self.errors.items()) for m in msgs]
+
+    def __str__(self):
+        return 'BulkValidationException: ' + str(self.messages)
+
+    def __repr__(self):
+        return str(self)
@@ -0,0 +1,180 @@
+from collections import OrderedDict
+import csv
+import itertools
+
+import django
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import get_language
+
+from .encoders import json_serialiser
+from .models import Attribute, Schema, composed_schema
+
+
+# Streaming export of attribute data.  Rows are read through the
+# queryset's iterator, which uses a server-side cursor on PostgreSQL, and
+# their schemata are resolved in bulk one chunk at a time, so memory use
+# does not grow with the size of the table.  Attributes are flattened into
+# one column each, with choice values rendered as their labels in the
+# export language from lookup tables built once per composed schema.
+# Only stored values are exported: defaults of attributes missing from a
+# row are not filled in.
+
+DEFAULT_CHUNK_SIZE = 2000
+
+
+def attribute_columns(model):
+    """
+    Returns the names of all attributes that the schemata of a model
+    define, in schema and attribute order.
+    """
+    content_type = ContentType.objects.get_for_model(model)
+    attrs = (Attribute.objects.filter(schema__content_type=content_type,
+                                      omit=False)
+             .order_by('schema__selectors', 'index')
+             .values_list('name', flat=True))
+    return list(OrderedDict.fromkeys(attrs))
+
+
+def choice_labels(attr, language, default_languages):
+    """
+    Returns a map from the choices of an attribute to their labels in a
+    language, or None if the attribute has no choices.
+    """
+    if attr.choices is None or attr.choices == []:
+        return None
+    labels = attr.choice_labels_xlat
+    if labels is None or labels == []:
+        labels = attr.choices
+    elif not isinstance(labels[0], str):
+        default = default_languages.get(attr.schema_id)
+        labels = [cl.get(language, cl.get(default)) for cl in labels]
+    return dict(zip(attr.choices, labels))
+
+
+def _renderer(labels):
+    def render(value):
+        if value is None:
+            return ''
+        if isinstance(value, list):
+            return [labels.get(v, v) for v in value]
+        return labels.get(value, value)
+    return render
+
+
+def _render_plain(value):
+    return '' if value is None else value
+
+
+class RecordExporter:
+    """
+    Turns the rows of a queryset into flat records, read in chunks.
+    """
+    def __init__(self, queryset, fields=None, language=None,
+                 chunk_size=DEFAULT_CHUNK_SIZE):
+        model = queryset.model
+        content_type = ContentType.objects.get_for_model(model)
+        related = Schema.objects.selector_related_paths(content_type)
+        self.queryset = (queryset.select_related(*related) if related
+                         else queryset)
+        attr_field = model._attr_field_name
+        if fields is None:
+            fields = [f.attname for f in model._meta.concrete_fields
+                      if f.attname != attr_field]
+        self.fields = list(fields)
+        self.attributes = attribute_columns(model)
+        self.language = language or get_language()
+        self.chunk_size = chunk_size
+        self._renderers = {}
+
+    @property
+    def columns(self):
+        return self.fields + self.attributes
+
+    def renderers(self, schemas):
+        """
+        Returns the value renderers of the attributes of a list of
+        schemata, built once per list.
+        """
+        if not schemas:
+            return {}
+        key = tuple(s.pk for s in schemas)
+        renderers = self._renderers.get(key)
+        if renderers is not None:
+            return renderers
+        composed = composed_schema(*schemas)
+        default_languages = {s.pk: s.default_language for s in schemas}
+        renderers = {}
+        for name, attr in composed.attributes.items():
+            labels = choice_labels(attr, self.language, default_languages)
+            renderers[name] = (_render_plain if labels is None
+                               else _renderer(labels))
+        self._renderers[key] = renderers
+        return renderers
+
+    def rows(self):
+        """
+        Yields each row with its list of schemata.
+        """
+        if django.VERSION >= (2, 0):
+            rows = self.queryset.iterator(chunk_size=self.chunk_size)
+        else:
+            rows = self.queryset.iterator()
+        while True:
+            chunk = list(itertools.islice(rows, self.chunk_size))
+            if not chunk:
+                return
+            yield from zip(chunk, Schema.objects.lookup_many(chunk))
+
+    def records(self):
+        """
+        Yields an OrderedDict of column values for each row.  Attributes
+        not stored for a row are left out.
+        """
+        for obj, schemas in self.rows():
+            record = OrderedDict((f, getattr(obj, f)) for f in self.fields)
+            data = obj._attr_field.data
+            renderers = self.renderers(schemas)
+            for name in self.attributes:
+                if name in data:
+                    render = renderers.get(name, _render_plain)
+                    record[name] = render(data[name])
+            yield record
+
+
+def export_csv(queryset, stream, **kwargs):
+    """
+    Writes the rows of a queryset to a stream as CSV, with a header row.
+    Lists and objects are written as JSON.  Returns the number of rows
+    written.
+    """
+    exporter = RecordExporter(queryset, **kwargs)
+    writer = csv.writer(stream)
+    writer.writerow(exporter.columns)
+    count = 0
+    for record in exporter.records():
+        writer.writerow([_csv_value(record.get(c)) for c in exporter.columns])
+        count += 1
+    return count
+
+
+def _csv_value(value):
+    if value is None:
+        return ''
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json_serialiser(value)
+    return value
+
+
+def export_ndjson(queryset, stream, **kwargs):
+    """
+    Writes the rows of a queryset to a stream as newline-delimited JSON.
+    Returns the number of rows written.
+    """
+    exporter = RecordExporter(queryset, **kwargs)
+    count = 0
+    for record in exporter.records():
+        stream.write(json_serialiser(record) + '\n')
+        count += 1
+    return count
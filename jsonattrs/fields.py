@@ -1,25 +1,39 @@
 from collections import UserDict
-import json
-from datetime import date, datetime
 from decimal import Decimal
+import functools
+import operator
 
 from psycopg2.extras import Json
 
-from django.core.exceptions import ValidationError
+from django.core.exceptions import FieldError, ValidationError
+from django.db.models import Expression, F
+from django.db.models.query_utils import DeferredAttribute
+from django.db.models.signals import pre_save
 from django.utils.translation import ugettext_lazy as _
 from django.contrib.postgres.fields import JSONField
 
-from .models import Schema, compose_schemas
+from .models import Schema, composed_schema
+from .encoders import (  # noqa: F401
+    convert, exact_decimals, json_loads, json_serialiser
+)
 from .exceptions import SchemaUpdateConflict, SchemaUpdateException
+from .selectors import forget_selector_sources, record_selector_sources
+from .signals import attribute_model_pre_save
+from .transforms import TYPED_CASTS, TypedKeysTransformFactory
 
 
 class JSONAttributes(UserDict):
     def __init__(self, data={}, *args, **kwargs):
         self._init_done = False
         self._schemas = None
+        self._composed = None
+        self._attached = None
         self._instance = None
         self._setup = False
         self._saved_selectors = None
+        self._changed = set()
+        self._removed = set()
+        self._replaced = False
         self._db_val = data
         super().__init__(data, *args, **kwargs)
         self._init_done = True
@@ -37,8 +51,6 @@ class JSONAttributes(UserDict):
                 if k not in self._attrs.keys():
                     raise ValidationError('Unknown key "{}"'.format(k))
 
-                self._check_key(k)
-                self._attrs[k].validate(v)
                 self[k] = v
 
     def setup_schema(self, schemas=None):
@@ -46,24 +58,37 @@ class JSONAttributes(UserDict):
             return
 
         # Determine schemas for model instance containing this field.
+        composed = None
         if schemas is not None:
             self._schemas = schemas
+        elif self._attached is not None:
+            self._schemas, composed, selectors = self._attached
+            if self._saved_selectors is None:
+                self._saved_selectors = selectors
         else:
-            self._schemas = Schema.objects.from_instance(self._instance)
+            # Instances with None selectors have no schemata.
+            self._schemas = Schema.objects.from_instance(self._instance) or []
+        self._attached = None
         self._setup = True
 
         # Extract schema attributes, names of required attributes and
         # names of attributes with defaults, composing schemas for
         # instance.
-        attrs = compose_schemas(*self._schemas)
-        self._attrs, self._required_attrs, self._default_attrs = attrs
+        if composed is None:
+            composed = composed_schema(*self._schemas)
+        self._composed = composed
 
         # Fill in defaulted attributes.
-        if len(self._required_attrs) > 0:
-            for key in self._required_attrs:
-                if (self._attrs[key].default is not None and
-                   self._attrs[key].default != ''):
-                    self[key] = self._attrs[key].default
+        for key, default in self._composed.required_defaults.items():
+            self[key] = default
+
+    def attach_schemas(self, schemas, composed, selectors):
+        """
+        Attach schemata resolved in bulk by Schema.objects.lookup_many, to
+        be used instead of a lookup when the schema is first needed.
+        """
+        if not self._setup:
+            self._attached = (schemas, composed, selectors)
 
     def _pre_save_selector_check(self, strict=False):
         if not self._setup:
@@ -77,17 +102,13 @@ class JSONAttributes(UserDict):
             return
         self._setup = False
         schemas_s = self._schemas
-        attrs_s = self._attrs
-        required_attrs_s = self._required_attrs
-        default_attrs_s = self._default_attrs
+        composed_s = self._composed
         self.setup_schema()
-        conflicts = self._attr_list_conflicts(attrs_s, self._attrs,
-                                              strict=strict)
+        conflicts = self._attr_list_conflicts(composed_s.attributes,
+                                              self._attrs, strict=strict)
         if conflicts is not None and len(conflicts) > 0:
             self._schemas = schemas_s
-            self._attrs = attrs_s
-            self._required_attrs = required_attrs_s
-            self._default_attrs = default_attrs_s
+            self._composed = composed_s
             raise SchemaUpdateException(conflicts=conflicts)
 
     def _attr_list_conflicts(self, old_attrs, new_attrs, strict=False):
@@ -128,17 +149,93 @@ class JSONAttributes(UserDict):
         if key not in self._attrs and key not in self:
             raise KeyError(key)
 
+    def __getitem__(self, key):
+        value = super().__getitem__(key)
+        if (isinstance(value, (int, Decimal)) and
+                not isinstance(value, bool) and exact_decimals()):
+            # Numbers are decoded as Decimals if they have a fractional
+            # part and as ints otherwise, whatever the attribute type:
+            # decimal attributes are read as Decimals and others as floats.
+            composed = self._read_schema()
+            if composed is not None:
+                if key in composed.decimals:
+                    value = Decimal(value)
+                elif isinstance(value, Decimal):
+                    value = float(value)
+        return value
+
+    def _read_schema(self):
+        # The composed schema, resolved without setting it up: reads must
+        # neither fill in defaults nor change the stored data.
+        if self._setup:
+            return self._composed
+        if self._attached is None and self._instance is not None:
+            Schema.objects.lookup_many([self._instance])
+        return self._attached[1] if self._attached is not None else None
+
     def __setitem__(self, key, value):
         if self._init_done:
             self._check_key(key)
-            self._attrs[key].validate(value)
+            self._composed.validate(key, value)
+            if key not in self.data or self.data[key] != value:
+                self._changed.add(key)
+                self._removed.discard(key)
         return super().__setitem__(key, value)
 
     def __delitem__(self, key):
         self._check_key(key)
         if key in self._required_attrs:
             raise KeyError(key)
-        return super().__delitem__(key)
+        super().__delitem__(key)
+        self._changed.discard(key)
+        self._removed.add(key)
+
+    @property
+    def has_changes(self):
+        return bool(self._changed or self._removed or self._replaced)
+
+    def save_changes(self, using=None):
+        """
+        Write only the attributes set or deleted since the instance was
+        loaded or last saved, with a single UPDATE that merges them into
+        the stored value.  Attributes written concurrently by others are
+        left alone.
+        """
+        instance = self._instance
+        if instance is None or instance._state.adding:
+            raise ValueError('Cannot save attribute changes of an unsaved '
+                             'model instance.')
+        field_name = instance._attr_field_name
+        if self._replaced:
+            instance.save(using=using, update_fields=[field_name])
+            return
+        if not self.has_changes:
+            return
+        patch = JSONBPatch(field_name,
+                           {k: self.data[k] for k in self._changed},
+                           self._removed)
+        model = type(instance)
+        model._base_manager.using(using or instance._state.db).filter(
+            pk=instance.pk
+        ).update(**{field_name: patch})
+        self._clear_changes()
+
+    def _clear_changes(self):
+        self._changed = set()
+        self._removed = set()
+        self._replaced = False
+
+    @property
+    def _attrs(self):
+        return self._composed.attributes
+
+    @property
+    def _required_attrs(self):
+        return self._composed.required
+
+    @property
+    def _default_attrs(self):
+        return self._composed.defaults
 
     @property
     def schemas(self):
@@ -160,22 +257,93 @@ def choices_compatible(new_choices, old_choices, value):
     return new_choices is None or len(new_choices) == 0 or value in new_choices
 
 
-def convert(val):
-    # This is needed to provide JSON serialisation for date objects
-    # whenever they're saved to JSON attribute fields.  This function is
-    # passed as the custom "dumps" method for psycopg2's Json class to
-    # use.
-    if isinstance(val, datetime) or isinstance(val, date):
-        return val.isoformat()
-    elif isinstance(val, Decimal):
-        return float(val)
-    else:
-        raise TypeError(
-            "{} can not be converted to JSON.".format(type(val).__name__))
-
+class JSONBPatch(Expression):
+    """
+    Update expression applying changed and removed top-level keys to a
+    jsonb column: (column - removed::text[]) || changed.
+    """
+    def __init__(self, field_name, changed, removed):
+        super().__init__(output_field=JSONField())
+        self.source = F(field_name)
+        self.changed = changed
+        self.removed = sorted(removed)
+
+    def resolve_expression(self, query=None, allow_joins=True, reuse=None,
+                           summarize=False, for_save=False):
+        clone = self.copy()
+        clone.source = self.source.resolve_expression(
+            query, allow_joins, reuse, summarize, for_save
+        )
+        return clone
+
+    def as_sql(self, compiler, connection):
+        sql, params = compiler.compile(self.source)
+        sql = "COALESCE({}, '{{}}'::jsonb)".format(sql)
+        params = list(params)
+        if self.removed:
+            sql = '({} - %s::text[])'.format(sql)
+            params.append(self.removed)
+        if self.changed:
+            sql = '({} || %s::jsonb)'.format(sql)
+            params.append(Json(self.changed, dumps=json_serialiser))
+        return sql, params
+
+
+class JSONAttributesDescriptor(DeferredAttribute):
+    """
+    Model attribute for a JSONAttributeField.  The raw value loaded from
+    the database is stored as-is, and only wrapped in JSONAttributes bound
+    to the model instance when it is first accessed.
+    """
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = instance.__dict__.get(self.field_name, self)
+        if value is self:
+            value = super().__get__(instance, cls)
+        if (not isinstance(value, JSONAttributes) or
+                value._instance is not instance):
+            value = self.bind(instance, value)
+        return value
 
-def json_serialiser(obj):
-    return json.dumps(obj, default=convert)
+    def __set__(self, instance, value):
+        data = instance.__dict__
+        if self.field_name not in data:
+            if instance._state.adding:
+                # Loading the instance: its selector sources match the
+                # stored attributes.
+                record_selector_sources(instance)
+            # Otherwise this is a deferred load, after which attribute
+            # changes are patched in as for any other load.
+        elif self._is_refresh(instance, value):
+            # refresh_from_db() hands over the attributes of a fresh copy
+            # of the instance.
+            value = value.data
+        else:
+            # Replaced attributes are checked against the schema on save,
+            # and written out in full.
+            forget_selector_sources(instance)
+            value = self.bind(instance, value)
+            value._replaced = True
+            return
+        data[self.field_name] = value
+
+    @staticmethod
+    def _is_refresh(instance, value):
+        source = getattr(value, '_instance', None)
+        return (source is not None and source is not instance and
+                type(source) is type(instance) and
+                not source._state.adding and source.pk == instance.pk and
+                not value.has_changes)
+
+    def bind(self, instance, value):
+        if not isinstance(value, JSONAttributes):
+            value = JSONAttributes(value)
+        value._instance = instance
+        value._get_from_instance = functools.partial(
+            getattr, instance, self.field_name)
+        instance.__dict__[self.field_name] = value
+        return value
 
 
 class JSONAttributeField(JSONField):
@@ -185,7 +353,36 @@ class JSONAttributeField(JSONField):
         kwargs['default'] = JSONAttributes
         super().__init__(*args, **kwargs)
 
+    def contribute_to_class(self, cls, name, **kwargs):
+        others = [f for f in cls._meta.local_fields
+                  if isinstance(f, JSONAttributeField) and f is not self]
+        if others:
+            raise FieldError('multiple JSONAttributeField fields: '
+                             'only one is allowed per model!')
+        super().contribute_to_class(cls, name, **kwargs)
+        setattr(cls, self.attname, JSONAttributesDescriptor(self.attname, cls))
+        cls._attr_field = property(operator.attrgetter(self.attname))
+        cls._attr_field_name = self.attname
+        if not cls._meta.abstract:
+            pre_save.connect(attribute_model_pre_save, sender=cls)
+
+    def pre_save(self, model_instance, add):
+        value = super().pre_save(model_instance, add)
+        if isinstance(value, JSONAttributes):
+            # The whole value is written, so nothing is left to patch.
+            value._clear_changes()
+        return value
+
+    def select_format(self, compiler, sql, params):
+        # Exact decimals need the JSON text, which psycopg2 would
+        # otherwise decode with floats.
+        if exact_decimals():
+            return '({})::text'.format(sql), params
+        return sql, params
+
     def from_db_value(self, value, expression, connection, context):
+        if isinstance(value, str) and exact_decimals():
+            return json_loads(value)
         return value
 
     def get_prep_value(self, value):
@@ -193,6 +390,11 @@ class JSONAttributeField(JSONField):
             return None
         return Json(dict(value), dumps=json_serialiser)
 
+    def get_transform(self, name):
+        if name in TYPED_CASTS:
+            return TypedKeysTransformFactory(name)
+        return super().get_transform(name)
+
     def get_prep_lookup(self, lookup_type, value):
         if lookup_type in ('has_key', 'has_keys', 'has_any_keys'):
             return value
@@ -0,0 +1,146 @@
+from collections import namedtuple
+import hashlib
+import re
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Attribute
+from .selectors import selector_config, selector_field
+from .transforms import attribute_type_cast, typed_key_sql
+
+
+# Indexes on attribute values are declared with Attribute.index_type and
+# created by sync_indexes (or the syncattrindexes management command).
+# Their names start with INDEX_PREFIX and end with a hash of their
+# definition, so a changed definition shows up as one index to drop and
+# another to create.  An index is scoped with a partial WHERE clause to
+# the rows matching the selectors of the schema declaring the attribute,
+# as far as they are stored in the model's own table.  Selectors stored
+# elsewhere are left out, so an index may also cover rows of other
+# schemata, whose values need not have the attribute's type: the typed
+# casts give NULL for those rather than failing the build or later writes.
+
+INDEX_PREFIX = 'jsonattrs_idx_'
+
+AttributeIndex = namedtuple('AttributeIndex', ('name', 'table', 'sql'))
+
+
+def attribute_models():
+    return [m for m in apps.get_models()
+            if getattr(m, '_attr_field_name', None) is not None]
+
+
+def _index_name(table, attr_name, definition):
+    digest = hashlib.md5(definition.encode('utf-8')).hexdigest()[:8]
+    name = '{}{}_{}'.format(INDEX_PREFIX, table[:20], attr_name[:20])
+    return re.sub(r'\W', '_', name).lower() + '_' + digest
+
+
+def _scope(model, schema, connection):
+    paths = selector_config().paths.get(
+        (model._meta.app_label, model._meta.model_name), ()
+    )
+    conditions = []
+    params = []
+    for path, value in zip(paths, schema.selectors):
+        field = selector_field(model, path)
+        if field is None:
+            continue
+        try:
+            value = field.to_python(value)
+        except ValidationError:
+            continue
+        conditions.append('{} = %s'.format(
+            connection.ops.quote_name(field.column)
+        ))
+        params.append(field.get_db_prep_value(value, connection))
+    return conditions, params
+
+
+def attribute_indexes(using=DEFAULT_DB_ALIAS):
+    """
+    Returns the indexes declared by schema attributes, as a map from index
+    names to AttributeIndex tuples.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    indexes = {}
+    attrs = (Attribute.objects.using(using)
+             .exclude(index_type='').filter(omit=False)
+             .select_related('schema__content_type', 'attr_type'))
+    for attr in attrs:
+        model = attr.schema.content_type.model_class()
+        field_name = getattr(model, '_attr_field_name', None)
+        if field_name is None:
+            continue
+        table = model._meta.db_table
+        column = qn(model._meta.get_field(field_name).column)
+        if attr.index_type == 'gin':
+            method = 'gin'
+            expression = '({} -> %s)'.format(column)
+        else:
+            method = 'btree'
+            expression = typed_key_sql(
+                column, attribute_type_cast(attr.attr_type.name)
+            )
+        conditions, params = _scope(model, attr.schema, connection)
+        sql = 'ON {} USING {} (({}))'.format(qn(table), method, expression)
+        if conditions:
+            sql += ' WHERE ' + ' AND '.join(conditions)
+        with connection.cursor() as cursor:
+            sql = cursor.cursor.mogrify(sql, [attr.name] + params)
+        sql = sql.decode('utf-8') if isinstance(sql, bytes) else sql
+        name = _index_name(table, attr.name, sql)
+        indexes[name] = AttributeIndex(name, table, sql)
+    return indexes
+
+
+def existing_indexes(using=DEFAULT_DB_ALIAS):
+    """
+    Returns the names of the jsonattrs indexes on attribute model tables,
+    with whether each is valid (an interrupted concurrent build leaves an
+    invalid index behind).
+    """
+    tables = [m._meta.db_table for m in attribute_models()]
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, i.indisvalid FROM pg_index i "
+            "JOIN pg_class c ON c.oid = i.indexrelid "
+            "JOIN pg_class t ON t.oid = i.indrelid "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = current_schema() "
+            "AND c.relname LIKE %s AND t.relname = ANY(%s)",
+            [INDEX_PREFIX.replace('_', '\\_') + '%', tables]
+        )
+        return dict(cursor.fetchall())
+
+
+def sync_indexes(using=DEFAULT_DB_ALIAS, concurrently=True, dry_run=False):
+    """
+    Creates the declared attribute indexes that are missing and drops the
+    jsonattrs indexes that are no longer declared.  Concurrent index
+    builds cannot run in a transaction.  Returns the lists of created and
+    dropped index names.
+    """
+    desired = attribute_indexes(using)
+    existing = existing_indexes(using)
+    drop = sorted(name for name, valid in existing.items()
+                  if name not in desired or not valid)
+    create = sorted(name for name in desired
+                    if name not in existing or name in drop)
+    if not dry_run:
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        mode = ' CONCURRENTLY' if concurrently else ''
+        with connection.cursor() as cursor:
+            for name in drop:
+                cursor.execute('DROP INDEX{} IF EXISTS {}'.format(
+                    mode, qn(name)
+                ))
+            for name in create:
+                cursor.execute('CREATE INDEX{} {} {}'.format(
+                    mode, qn(name), desired[name].sql
+                ))
+    return create, drop
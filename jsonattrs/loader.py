@@ -0,0 +1,244 @@
+from collections import namedtuple
+import csv
+import datetime
+from decimal import Decimal
+from io import StringIO
+from itertools import islice
+import json
+
+from psycopg2.extras import Json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.exceptions import ValidationError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .encoders import json_serialiser
+from .models import Schema, composed_schemas_many
+
+
+# Bulk loading of attribute data.  Records are plain dicts mapping model
+# field names (or attnames, e.g. "project_id") and attribute names to
+# values, read as a stream and processed in chunks: each chunk's records
+# are turned into unsaved model instances, their schemata are resolved
+# with one lookup per distinct selector tuple, their attributes are
+# validated against the composed schemata, and the valid records are
+# written with a single COPY.  Invalid records are handed to a reject
+# callback along with their error messages.
+#
+# Loading bypasses Model.save(), so no model signals are sent, and
+# database constraint violations fail the whole chunk rather than single
+# records.
+
+LoadResult = namedtuple('LoadResult', ('loaded', 'rejected'))
+
+DEFAULT_CHUNK_SIZE = 5000
+
+
+def read_csv(stream):
+    """
+    Reads records from CSV with a header row.  Empty cells are read as
+    empty strings.
+    """
+    for row in csv.DictReader(stream):
+        yield {k: v for k, v in row.items() if k and v is not None}
+
+
+def read_ndjson(stream):
+    """
+    Reads records from newline-delimited JSON.  Lines that are not valid
+    JSON are passed on as strings, to be rejected by the loader.
+    """
+    for line in stream:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            yield json.loads(line)
+        except ValueError:
+            yield line
+
+
+class RecordLoader:
+    """
+    Validates and loads records into a model with a JSONAttributeField.
+    """
+    def __init__(self, model, using=DEFAULT_DB_ALIAS,
+                 chunk_size=DEFAULT_CHUNK_SIZE, reject=None):
+        self.model = model
+        self.using = using
+        self.chunk_size = chunk_size
+        self.reject = reject
+        self.content_type = ContentType.objects.db_manager(
+            using
+        ).get_for_model(model)
+        self.attr_field = model._meta.get_field(model._attr_field_name)
+        self.fields = {}
+        for field in model._meta.concrete_fields:
+            self.fields[field.name] = field
+            self.fields[field.attname] = field
+        pk = model._meta.pk
+        self.columns = [f for f in model._meta.concrete_fields
+                        if f is not pk or pk.get_internal_type() not in (
+                            'AutoField', 'BigAutoField')]
+
+    def load(self, records):
+        loaded = rejected = 0
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.chunk_size))
+            if not chunk:
+                break
+            valid = []
+            for record, errors in self.validate(chunk):
+                if errors:
+                    rejected += 1
+                    if self.reject is not None:
+                        self.reject(record, errors)
+                else:
+                    valid.append(record)
+            if valid:
+                self.copy(valid)
+                loaded += len(valid)
+        return LoadResult(loaded, rejected)
+
+    def validate(self, records):
+        """
+        Returns a list of (instance or record, errors) pairs for a chunk
+        of records, with an instance for each valid record and the record
+        itself for each invalid one.
+        """
+        pending = []
+        results = []
+        for record in records:
+            if not isinstance(record, dict):
+                results.append((record, ['Invalid record']))
+                continue
+            try:
+                instance, attrs = self.build(record)
+            except ValidationError as e:
+                results.append((record, e.messages))
+                continue
+            selectors = Schema.objects._get_selectors(instance,
+                                                      self.content_type)
+            results.append(None)
+            pending.append((len(results) - 1, record, instance, attrs,
+                            (self.content_type, selectors)))
+
+        # One schema lookup per distinct selector tuple in the chunk.
+        schemas = Schema.objects.db_manager(self.using).lookup_selectors(
+            [key for *_, key in pending]
+        )
+        found = list(schemas.items())
+        composed = dict(zip([k for k, _ in found],
+                            composed_schemas_many([sl for _, sl in found])))
+        for index, record, instance, attrs, key in pending:
+            if key not in composed:
+                results[index] = (record, ['No schema for selectors '
+                                           '{}'.format(list(key[1]))])
+                continue
+            errors = self.validate_attributes(attrs, composed[key])
+            if errors:
+                results[index] = (record, errors)
+            else:
+                instance.__dict__[self.attr_field.attname] = attrs
+                results[index] = (instance, [])
+        return results
+
+    def build(self, record):
+        values = {}
+        attrs = {}
+        for key, value in record.items():
+            field = self.fields.get(key)
+            if field is None:
+                # Attributes use empty values for missing ones, so that
+                # one file can hold records of different schemata.
+                if value != '':
+                    attrs[key] = value
+            elif field is self.attr_field:
+                if not isinstance(value, dict):
+                    raise ValidationError(
+                        'Invalid value for {}'.format(key)
+                    )
+                attrs.update(value)
+            else:
+                if value == '' and field.null:
+                    value = None
+                try:
+                    values[field.attname] = field.to_python(value)
+                except ValidationError as e:
+                    raise ValidationError('{}: {}'.format(
+                        key, '; '.join(e.messages)
+                    ))
+        return self.model(**values), attrs
+
+    def validate_attributes(self, attrs, composed):
+        errors = []
+        for key, value in attrs.items():
+            if key not in composed.attributes:
+                errors.append('Unknown key "{}"'.format(key))
+                continue
+            try:
+                composed.validate(key, value)
+            except ValidationError as e:
+                errors.extend(e.messages)
+        for key, default in composed.required_defaults.items():
+            attrs.setdefault(key, default)
+        for key in composed.required:
+            if key not in attrs:
+                errors.append('Missing required field {}'.format(key))
+        return errors
+
+    def copy(self, instances):
+        connection = connections[self.using]
+        qn = connection.ops.quote_name
+        buf = StringIO()
+        for instance in instances:
+            buf.write('\t'.join(
+                copy_text(f.get_db_prep_save(f.pre_save(instance, True),
+                                             connection))
+                for f in self.columns
+            ))
+            buf.write('\n')
+        buf.seek(0)
+        sql = 'COPY {} ({}) FROM STDIN'.format(
+            qn(self.model._meta.db_table),
+            ', '.join(qn(f.column) for f in self.columns)
+        )
+        with transaction.atomic(using=self.using):
+            with connection.cursor() as cursor:
+                cursor.cursor.copy_expert(sql, buf)
+
+
+def copy_text(value):
+    """
+    Returns a database-ready value in COPY's text format.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, Json):
+        value = json_serialiser(value.adapted)
+    elif isinstance(value, bool):
+        value = 't' if value else 'f'
+    elif isinstance(value, (datetime.date, datetime.time)):
+        value = value.isoformat()
+    elif isinstance(value, (list, tuple)):
+        value = '{' + ','.join(
+            'NULL' if v is None else
+            '"' + str(v).replace('\\', '\\\\').replace('"', '\\"') + '"'
+            for v in value
+        ) + '}'
+    elif not isinstance(value, (str, int, float, Decimal)):
+        value = str(value)
+    return (str(value).replace('\\', '\\\\').replace('\t', '\\t')
+            .replace('\n', '\\n').replace('\r', '\\r'))
+
+
+def load_records(model, records, using=DEFAULT_DB_ALIAS,
+                 chunk_size=DEFAULT_CHUNK_SIZE, reject=None):
+    """
+    Validates and loads an iterable of records into a model, returning a
+    LoadResult with the numbers of loaded and rejected records.  Invalid
+    records are passed to ``reject(record, errors)`` if it is given.
+    """
+    return RecordLoader(model, using=using, chunk_size=chunk_size,
+                        reject=reject).load(records)
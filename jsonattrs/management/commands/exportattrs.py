@@ -0,0 +1,73 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from jsonattrs.export import DEFAULT_CHUNK_SIZE, export_csv, export_ndjson
+
+
+WRITERS = {
+    'csv': export_csv,
+    'ndjson': export_ndjson,
+}
+
+
+class Command(BaseCommand):
+    help = ("Export records with attributes to a CSV or newline-delimited "
+            "JSON file, one column per attribute.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('model',
+                            help='Model to export, as app_label.model')
+        parser.add_argument('path', nargs='?', default='-',
+                            help="File to write, or '-' for stdout")
+        parser.add_argument(
+            '--format',
+            dest='format',
+            choices=sorted(WRITERS),
+            help='Output format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--language',
+            dest='language',
+            help='Language for choice labels'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of rows fetched at a time'
+        )
+        parser.add_argument(
+            '--database',
+            dest='database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to export records from'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (ValueError, LookupError):
+            raise CommandError("Unknown model '{}'".format(options['model']))
+        if getattr(model, '_attr_field_name', None) is None:
+            raise CommandError("Model '{}' has no attribute field".format(
+                options['model']
+            ))
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+        queryset = model._base_manager.using(options['database']).order_by()
+        stream = (self.stdout if path == '-'
+                  else open(path, 'w', newline=''))
+        try:
+            count = WRITERS[fmt](queryset, stream,
+                                 language=options['language'],
+                                 chunk_size=options['chunk_size'])
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        if path != '-':
+            self.stdout.write('Exported {} records'.format(count))
@@ -0,0 +1,88 @@
+import json
+import sys
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from jsonattrs.loader import (
+    DEFAULT_CHUNK_SIZE, load_records, read_csv, read_ndjson
+)
+
+
+READERS = {
+    'csv': read_csv,
+    'ndjson': read_ndjson,
+}
+
+
+class Command(BaseCommand):
+    help = ("Bulk load records with attributes from a CSV or "
+            "newline-delimited JSON file.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', help='Model to load, as app_label.model')
+        parser.add_argument('path', help="File to load, or '-' for stdin")
+        parser.add_argument(
+            '--format',
+            dest='format',
+            choices=sorted(READERS),
+            help='Input format (default: from the file extension)'
+        )
+        parser.add_argument(
+            '--reject',
+            dest='reject',
+            help='File to write rejected records to, as JSON lines'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            dest='chunk_size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Number of records validated and copied at a time'
+        )
+        parser.add_argument(
+            '--database',
+            dest='database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to load records into'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            model = apps.get_model(options['model'])
+        except (ValueError, LookupError):
+            raise CommandError("Unknown model '{}'".format(options['model']))
+        if getattr(model, '_attr_field_name', None) is None:
+            raise CommandError("Model '{}' has no attribute field".format(
+                options['model']
+            ))
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+        reject_file = None
+        if options['reject']:
+            reject_file = open(options['reject'], 'w')
+
+        def write_reject(record, errors):
+            reject_file.write(json.dumps(
+                {'record': record, 'errors': errors}, default=str
+            ) + '\n')
+
+        stream = sys.stdin if path == '-' else open(path, newline='')
+        try:
+            result = load_records(
+                model, READERS[fmt](stream), using=options['database'],
+                chunk_size=options['chunk_size'],
+                reject=write_reject if reject_file is not None else None
+            )
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+            if reject_file is not None:
+                reject_file.close()
+        self.stdout.write('Loaded {} records, rejected {}'.format(
+            result.loaded, result.rejected
+        ))
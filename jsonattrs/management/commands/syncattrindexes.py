@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from jsonattrs.indexes import sync_indexes
+
+
+class Command(BaseCommand):
+    help = ("Create and drop database indexes on attribute values to match "
+            "the index types declared by schema attributes.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            dest='database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to synchronise indexes for'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Only report the changes that would be made'
+        )
+        parser.add_argument(
+            '--no-concurrently',
+            action='store_false',
+            dest='concurrently',
+            default=True,
+            help='Build indexes without CONCURRENTLY, locking out writes'
+        )
+
+    def handle(self, *args, **options):
+        created, dropped = sync_indexes(
+            using=options['database'],
+            concurrently=options['concurrently'],
+            dry_run=options['dry_run']
+        )
+        prefix = 'Would ' if options['dry_run'] else ''
+        for name in dropped:
+            self.stdout.write('{}{} index {}'.format(
+                prefix, 'drop' if prefix else 'Dropped', name
+            ))
+        for name in created:
+            self.stdout.write('{}{} index {}'.format(
+                prefix, 'create' if prefix else 'Created', name
+            ))
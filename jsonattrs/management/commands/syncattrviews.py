@@ -0,0 +1,63 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from jsonattrs.views import sync_views
+
+
+class Command(BaseCommand):
+    help = ("Create, refresh and drop typed database views of attribute "
+            "data, one per schema.")
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--materialized',
+            action='store_true',
+            dest='materialized',
+            default=False,
+            help='Create materialized views'
+        )
+        parser.add_argument(
+            '--no-refresh',
+            action='store_false',
+            dest='refresh',
+            default=True,
+            help='Do not refresh unchanged materialized views'
+        )
+        parser.add_argument(
+            '--concurrently',
+            action='store_true',
+            dest='concurrently',
+            default=False,
+            help='Refresh materialized views without locking out reads'
+        )
+        parser.add_argument(
+            '--database',
+            dest='database',
+            default=DEFAULT_DB_ALIAS,
+            help='Database to synchronise views for'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            dest='dry_run',
+            default=False,
+            help='Only report the changes that would be made'
+        )
+
+    def handle(self, *args, **options):
+        result = sync_views(
+            materialized=options['materialized'],
+            refresh=options['refresh'],
+            concurrently=options['concurrently'],
+            using=options['database'],
+            dry_run=options['dry_run']
+        )
+        for action, done, names in (
+                ('drop', 'Dropped', result.dropped),
+                ('create', 'Created', result.created),
+                ('refresh', 'Refreshed', result.refreshed)):
+            for name in names:
+                if options['dry_run']:
+                    self.stdout.write('Would {} view {}'.format(action, name))
+                else:
+                    self.stdout.write('{} view {}'.format(done, name))
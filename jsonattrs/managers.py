@@ -0,0 +1,235 @@
+from collections import OrderedDict, namedtuple
+import itertools
+
+from django.core.exceptions import EmptyResultSet, ValidationError
+from django.db import connections, models, transaction
+from django.db.models import Case, Value, When
+from django.db.models.functions import Cast
+from django.db.models.query import ModelIterable
+from django.contrib.contenttypes.models import ContentType
+from django.utils.translation import get_language
+
+from .exceptions import BulkValidationException, SchemaUpdateException
+from .export import choice_labels
+from .models import Schema, composed_schemas_many
+from .selectors import record_selector_sources, selector_check_needed
+
+
+# The number of rows with a value for an attribute, and its label.
+FacetCount = namedtuple('FacetCount', ('value', 'label', 'count'))
+
+
+def validate_attributes(objs, update_fields=None):
+    """
+    Checks the attributes of model instances about to be saved against
+    their schemata, as the pre_save signal handler does for a single save,
+    filling in defaults.  Schemata are resolved once per distinct selector
+    tuple.  Raises BulkValidationException with the errors of all invalid
+    instances.
+    """
+    checked = []
+    for i, obj in enumerate(objs):
+        if selector_check_needed(obj, obj._attr_field_name, update_fields):
+            checked.append((i, obj))
+    Schema.objects.lookup_many(
+        [obj for _, obj in checked if not obj._attr_field._setup]
+    )
+    errors = {}
+    for i, obj in checked:
+        try:
+            obj._attr_field._pre_save_selector_check()
+        except (ValidationError, SchemaUpdateException) as e:
+            errors[i] = e.messages
+            continue
+        if update_fields is None:
+            record_selector_sources(obj)
+    if errors:
+        raise BulkValidationException(errors=errors)
+
+
+class JSONAttributesQuerySetMixin:
+    """
+    QuerySet mixin for models with a JSONAttributeField.
+    """
+    _prefetch_schemas = False
+
+    def prefetch_schemas(self):
+        """
+        Resolve the schemata of all rows in bulk as the queryset is
+        evaluated, following the relations named in the model's
+        JSONATTRS_SCHEMA_SELECTORS paths with select_related so that
+        computing selectors needs no further queries.
+        """
+        content_type = ContentType.objects.get_for_model(self.model)
+        related = Schema.objects.selector_related_paths(content_type)
+        clone = self.select_related(*related) if related else self._clone()
+        clone._prefetch_schemas = True
+        return clone
+
+    def _clone(self, *args, **kwargs):
+        clone = super()._clone(*args, **kwargs)
+        clone._prefetch_schemas = self._prefetch_schemas
+        return clone
+
+    def _attaches_schemas(self):
+        return (self._prefetch_schemas and
+                issubclass(self._iterable_class, ModelIterable))
+
+    def _fetch_all(self):
+        fetched = self._result_cache is None
+        super()._fetch_all()
+        if fetched and self._attaches_schemas():
+            Schema.objects.lookup_many(self._result_cache)
+
+    def iterator(self, *args, **kwargs):
+        rows = super().iterator(*args, **kwargs)
+        if not self._attaches_schemas():
+            return rows
+        chunk_size = kwargs.get('chunk_size', args[0] if args else 2000)
+        return self._iterate_with_schemas(rows, chunk_size)
+
+    def _iterate_with_schemas(self, rows, chunk_size):
+        while True:
+            chunk = list(itertools.islice(rows, chunk_size))
+            if not chunk:
+                return
+            Schema.objects.lookup_many(chunk)
+            yield from chunk
+
+    def facet_counts(self, *names, language=None):
+        """
+        Counts the rows of the queryset for each value of each of the named
+        choice attributes, with one query.  Returns a map from attribute
+        names to lists of FacetCount tuples: one per choice of the
+        attributes in the composed schemata of the rows, in schema order
+        and labelled in the given (or current) language, followed by any
+        other values found.  Rows with lists of values count for each of
+        their values.
+        """
+        language = language or get_language()
+        labels = {name: OrderedDict() for name in names}
+        for schemas, composed in self._facet_schemata():
+            default_languages = {s.pk: s.default_language for s in schemas}
+            for name in names:
+                attr = composed.attributes.get(name)
+                if attr is None:
+                    continue
+                found = choice_labels(attr, language, default_languages)
+                for value, label in (found or {}).items():
+                    labels[name].setdefault(value, label)
+
+        counts = {name: {} for name in names}
+        try:
+            scope_sql, scope_params = (self.order_by().values('pk').query
+                                       .sql_with_params())
+        except EmptyResultSet:
+            scope_sql = None
+        if scope_sql is not None and names:
+            qn = connections[self.db].ops.quote_name
+            meta = self.model._meta
+            col = 'rows.' + qn(
+                meta.get_field(self.model._attr_field_name).column
+            )
+            # Scalars count as one-element lists.
+            facet = ("SELECT %s, value FROM jsonb_array_elements_text("
+                     "CASE WHEN jsonb_typeof({col} -> %s) = 'array' "
+                     "THEN {col} -> %s ELSE jsonb_build_array({col} ->> %s) "
+                     "END) value".format(col=col))
+            with connections[self.db].cursor() as cursor:
+                cursor.execute(
+                    'SELECT facet.name, facet.value, count(*) FROM {} rows '
+                    'CROSS JOIN LATERAL ({}) facet (name, value) '
+                    'WHERE rows.{} IN ({}) '
+                    "AND facet.value <> '' GROUP BY 1, 2".format(
+                        qn(meta.db_table),
+                        ' UNION ALL '.join([facet] * len(names)),
+                        qn(meta.pk.column), scope_sql
+                    ),
+                    [p for name in names for p in [name] * 4] +
+                    list(scope_params)
+                )
+                for name, value, count in cursor.fetchall():
+                    counts[name][value] = count
+
+        result = OrderedDict()
+        for name in names:
+            found = counts[name]
+            result[name] = [FacetCount(value, label, found.pop(value, 0))
+                            for value, label in labels[name].items()]
+            result[name].extend(FacetCount(v, v, c)
+                                for v, c in sorted(found.items()))
+        return result
+
+    def _facet_schemata(self):
+        # The schema lists of the distinct selector tuples of the rows,
+        # with their composed schemata.
+        content_type = ContentType.objects.get_for_model(self.model)
+        paths = [p.replace('.', '__')
+                 for p in Schema.objects.selector_paths(content_type)]
+        if paths:
+            selectors = self.order_by().values_list(*paths).distinct()
+            # Rows with None selectors have no schemata.
+            keys = sorted((content_type, tuple(str(v) for v in row))
+                          for row in selectors if None not in row)
+        else:
+            keys = [(content_type, ())]
+        found = Schema.objects.db_manager(self.db).lookup_selectors(keys)
+        schema_lists = [found[k] for k in keys if k in found]
+        return zip(schema_lists, composed_schemas_many(schema_lists))
+
+    def bulk_create(self, objs, batch_size=None):
+        """
+        Validates the objects' attributes against their schemata before
+        inserting them with QuerySet.bulk_create.
+        """
+        objs = list(objs)
+        validate_attributes(objs)
+        return super().bulk_create(objs, batch_size=batch_size)
+
+    def bulk_update(self, objs, fields, batch_size=None):
+        """
+        Validates the objects' attributes against their schemata, then
+        writes the given fields of all of them with one UPDATE statement
+        per batch.  Returns the number of rows updated.
+        """
+        objs = list(objs)
+        if not objs:
+            return 0
+        fields = [self.model._meta.get_field(name) for name in fields]
+        if any(not f.concrete or f.many_to_many or f.primary_key
+               for f in fields):
+            raise ValueError('bulk_update() can only be used with concrete, '
+                             'non-primary key fields.')
+        if any(obj.pk is None for obj in objs):
+            raise ValueError('All bulk_update() objects must have a '
+                             'primary key set.')
+        validate_attributes(objs, [f.name for f in fields])
+
+        batch_size = batch_size or len(objs)
+        updated = 0
+        with transaction.atomic(using=self.db, savepoint=False):
+            for start in range(0, len(objs), batch_size):
+                batch = objs[start:start + batch_size]
+                updates = {}
+                for field in fields:
+                    # CASE branches are untyped parameters in PostgreSQL,
+                    # so the result is cast to the column type.
+                    case = Case(*[
+                        When(pk=obj.pk, then=Value(field.pre_save(obj, False),
+                                                   output_field=field))
+                        for obj in batch
+                    ], output_field=field)
+                    updates[field.attname] = Cast(case, output_field=field)
+                updated += self.filter(
+                    pk__in=[obj.pk for obj in batch]
+                ).update(**updates)
+        return updated
+
+
+class JSONAttributesQuerySet(JSONAttributesQuerySetMixin, models.QuerySet):
+    pass
+
+
+class JSONAttributesManager(
+        models.Manager.from_queryset(JSONAttributesQuerySet)):
+    pass
@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonattrs', '0005_remove_monolingual_fields'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                "CREATE OR REPLACE FUNCTION jsonattrs_date(text) "
+                "RETURNS date AS $$ SELECT $1::date $$ "
+                "LANGUAGE sql IMMUTABLE STRICT",
+                "CREATE OR REPLACE FUNCTION jsonattrs_timestamp(text) "
+                "RETURNS timestamp AS $$ SELECT $1::timestamp $$ "
+                "LANGUAGE sql IMMUTABLE STRICT",
+            ],
+            reverse_sql=[
+                "DROP FUNCTION IF EXISTS jsonattrs_date(text)",
+                "DROP FUNCTION IF EXISTS jsonattrs_timestamp(text)",
+            ],
+        ),
+    ]
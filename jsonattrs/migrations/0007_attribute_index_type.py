@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonattrs', '0006_typed_cast_functions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attribute',
+            name='index_type',
+            field=models.CharField(blank=True, choices=[('', 'None'), ('btree', 'B-tree'), ('gin', 'GIN')], default='', max_length=8),
+        ),
+    ]
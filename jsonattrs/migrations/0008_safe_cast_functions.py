@@ -0,0 +1,135 @@
+# -*- coding: utf-8 -*-
+from __future__ import unicode_literals
+
+from django.db import migrations
+
+
+# The typed casts are plain SQL expressions, so that PostgreSQL can inline
+# them into queries.  Values are only cast once they match a pattern that
+# the cast is known to accept, and are NULL otherwise.  Dates and
+# timestamps are built from their ISO 8601 fields, so that the result
+# does not depend on the DateStyle or TimeZone settings, and timestamps
+# with a UTC offset are converted to UTC.
+
+def guarded_cast(name, sql_type, pattern, operator='~'):
+    return (
+        "CREATE OR REPLACE FUNCTION {name}(value text) RETURNS {type} AS $$ "
+        "SELECT CASE WHEN value {op} '{pattern}' THEN value::{type} END "
+        "$$ LANGUAGE sql IMMUTABLE".format(
+            name=name, type=sql_type, op=operator, pattern=pattern
+        )
+    )
+
+
+INT_PATTERN = r'^\s*[-+]?(\d{1,18}|[0-8]\d{18})\s*$'
+NUMERIC_PATTERN = r'^\s*[-+]?(\d+(\.\d*)?|\.\d+)([eE][-+]?\d{1,4})?\s*$'
+BOOL_PATTERN = r'^\s*(t|true|f|false|y|yes|n|no|on|off|1|0)\s*$'
+DATE_PATTERN = r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])([T ]|$)'
+TIMESTAMP_PATTERN = (
+    r'^\d{4}-(0[1-9]|1[0-2])-(0[1-9]|[12]\d|3[01])'
+    r'([T ]([01]\d|2[0-3]):[0-5]\d(:[0-5]\d(\.\d+)?)?'
+    r'\s*(Z|[-+]([01]\d|2[0-3])(:?[0-5]\d)?)?)?$'
+)
+
+FLOAT_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION jsonattrs_float(value text)
+RETURNS double precision AS $$
+SELECT CASE WHEN value ~ '{}' THEN
+    CASE WHEN abs(value::numeric) = 0 OR abs(value::numeric)
+              BETWEEN 2.2250738585072014e-308 AND 1.7976931348623157e308
+    THEN value::double precision END
+END
+$$ LANGUAGE sql IMMUTABLE
+""".format(NUMERIC_PATTERN)
+
+# The date for a year, month and day, or NULL if there is no such day.
+MAKE_DATE_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION jsonattrs_make_date(y int, m int, d int)
+RETURNS date AS $$
+SELECT CASE WHEN y BETWEEN 1 AND 9999 AND m BETWEEN 1 AND 12
+                 AND d BETWEEN 1 AND 31 THEN
+    CASE WHEN date_part('month', make_date(y, m, 1) + (d - 1)) = m
+    THEN make_date(y, m, 1) + (d - 1) END
+END
+$$ LANGUAGE sql IMMUTABLE
+"""
+
+# The interval for a UTC offset: Z, +HH, +HHMM or +HH:MM.
+UTC_OFFSET_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION jsonattrs_utc_offset(zone text)
+RETURNS interval AS $$
+SELECT CASE WHEN zone IS NULL OR zone = 'Z' THEN make_interval() ELSE
+    make_interval(mins => (CASE WHEN left(zone, 1) = '-' THEN -1 ELSE 1 END) *
+        (substr(zone, 2, 2)::int * 60 +
+         coalesce(substring(zone from '^[-+]\d{2}:?(\d{2})$')::int, 0)))
+END
+$$ LANGUAGE sql IMMUTABLE
+"""
+
+DATE_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION jsonattrs_date(value text) RETURNS date AS $$
+SELECT CASE WHEN value ~ '{}' THEN
+    jsonattrs_make_date(substr(value, 1, 4)::int, substr(value, 6, 2)::int,
+                        substr(value, 9, 2)::int)
+END
+$$ LANGUAGE sql IMMUTABLE
+""".format(DATE_PATTERN)
+
+TIMESTAMP_FUNCTION = r"""
+CREATE OR REPLACE FUNCTION jsonattrs_timestamp(value text)
+RETURNS timestamp AS $$
+SELECT CASE WHEN value ~ '{}' THEN
+    jsonattrs_make_date(substr(value, 1, 4)::int, substr(value, 6, 2)::int,
+                        substr(value, 9, 2)::int) +
+    CASE WHEN length(value) = 10 THEN make_interval() ELSE
+        make_interval(
+            hours => substr(value, 12, 2)::int,
+            mins => substr(value, 15, 2)::int,
+            secs => coalesce(substring(
+                value from '^.{{16}}:(\d{{2}}(?:\.\d+)?)'
+            )::double precision, 0)
+        ) - jsonattrs_utc_offset(substring(
+            value from '^.{{16}}(?::[\d.]+)?\s*(Z|[-+][\d:]+)$'
+        ))
+    END
+END
+$$ LANGUAGE sql IMMUTABLE
+""".format(TIMESTAMP_PATTERN)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('jsonattrs', '0007_attribute_index_type'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=[
+                guarded_cast('jsonattrs_int', 'bigint', INT_PATTERN),
+                guarded_cast('jsonattrs_numeric', 'numeric',
+                             NUMERIC_PATTERN),
+                FLOAT_FUNCTION,
+                guarded_cast('jsonattrs_bool', 'boolean', BOOL_PATTERN,
+                             operator='~*'),
+                MAKE_DATE_FUNCTION,
+                UTC_OFFSET_FUNCTION,
+                DATE_FUNCTION,
+                TIMESTAMP_FUNCTION,
+            ],
+            reverse_sql=[
+                "DROP FUNCTION IF EXISTS jsonattrs_int(text)",
+                "DROP FUNCTION IF EXISTS jsonattrs_numeric(text)",
+                "DROP FUNCTION IF EXISTS jsonattrs_float(text)",
+                "DROP FUNCTION IF EXISTS jsonattrs_bool(text)",
+                "CREATE OR REPLACE FUNCTION jsonattrs_date(text) "
+                "RETURNS date AS $$ SELECT $1::date $$ "
+                "LANGUAGE sql IMMUTABLE STRICT",
+                "CREATE OR REPLACE FUNCTION jsonattrs_timestamp(text) "
+                "RETURNS timestamp AS $$ SELECT $1::timestamp $$ "
+                "LANGUAGE sql IMMUTABLE STRICT",
+                "DROP FUNCTION IF EXISTS jsonattrs_make_date(int, int, int)",
+                "DROP FUNCTION IF EXISTS jsonattrs_utc_offset(text)",
+            ],
+        ),
+    ]
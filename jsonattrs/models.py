@@ -1,29 +1,116 @@
 from collections import OrderedDict
+import datetime
+from decimal import Decimal
+import functools
+import operator
 import re
+from types import MappingProxyType
 
-from django.db import models
-from django.conf import settings
+from django.db import models, transaction
 from django.utils.translation import ugettext_lazy as _
 from django.utils.translation import get_language
 from django.core.exceptions import ValidationError
-from django.core.cache import caches
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.postgres.fields import ArrayField
 from django.contrib.postgres.fields import JSONField
 
+from .cache import (
+    cache_get_many, cache_set_many, cache_clear,
+    composed_cache, composed_cache_size,
+    schema_generations, bump_schema_generation
+)
+from .selectors import _MISSING, _cached_related, selector_config
 
-def schema_cache_key(content_type, selectors):
+
+def schema_cache_key(content_type, selectors, generations=None):
+    if generations is None:
+        generations = schema_generations([content_type.pk])
     return ('jsonattrs:schema:' +
             content_type.app_label + ',' + content_type.model + ':' +
+            str(generations[content_type.pk]) + ':' +
             ','.join([str(s) for s in selectors]))
 
 
+def compose_cache_key(schemas, generations=None):
+    content_type_ids = sorted({s.content_type_id for s in schemas})
+    if generations is None:
+        generations = schema_generations(content_type_ids)
+    return ('jsonattrs:compose:' +
+            ','.join([str(generations[ct]) for ct in content_type_ids]) +
+            ':' + ','.join([str(s.pk) for s in schemas]))
+
+
+class SchemaCacheQuerySet(models.QuerySet):
+    """
+    QuerySet whose bulk writes invalidate cached schemata for the content
+    types of the rows they touch.
+    """
+    content_type_lookup = None
+
+    def content_type_ids(self):
+        ids = (self.order_by()
+               .values_list(self.content_type_lookup, flat=True)
+               .distinct())
+        return {ct for ct in ids if ct is not None}
+
+    def invalidate_cache(self):
+        for content_type_id in self.content_type_ids():
+            SchemaManager.invalidate_cache(content_type_id)
+
+    def _for_pks(self, pks):
+        return type(self)(self.model, using=self.db).filter(pk__in=pks)
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        self._for_pks([o.pk for o in objs]).invalidate_cache()
+        return objs
+
+    def update(self, **kwargs):
+        # Rows may move between content types, so invalidate for both
+        # the old and the new ones.
+        pks = list(self.values_list('pk', flat=True))
+        content_type_ids = self.content_type_ids()
+        rows = super().update(**kwargs)
+        content_type_ids |= self._for_pks(pks).content_type_ids()
+        for content_type_id in content_type_ids:
+            SchemaManager.invalidate_cache(content_type_id)
+        return rows
+    update.alters_data = True
+
+    def delete(self):
+        content_type_ids = self.content_type_ids()
+        result = super().delete()
+        for content_type_id in content_type_ids:
+            SchemaManager.invalidate_cache(content_type_id)
+        return result
+    delete.alters_data = True
+
+
+class SchemaQuerySet(SchemaCacheQuerySet):
+    content_type_lookup = 'content_type_id'
+
+
 class SchemaManager(models.Manager):
-    content_type_to_selectors = dict()
+    def get_queryset(self):
+        return SchemaQuerySet(self.model, using=self._db)
 
     @classmethod
-    def invalidate_cache(cls):
-        caches['jsonattrs'].clear()
+    def invalidate_cache(cls, content_type_id=None):
+        """
+        Invalidate cached schemata and composed schemata for a content
+        type, or flush the whole jsonattrs cache if no content type is
+        given.
+        """
+        if content_type_id is None:
+            cache_clear()
+        else:
+            # Bump immediately so that the current transaction sees its
+            # own changes, and again on commit so that nothing cached by
+            # other connections from the pre-commit state survives.
+            bump_schema_generation(content_type_id)
+            transaction.on_commit(
+                functools.partial(bump_schema_generation, content_type_id)
+            )
 
     def lookup(self, instance=None, content_type=None, selectors=None):
         if instance is not None and content_type is None:
@@ -34,46 +121,128 @@ class SchemaManager(models.Manager):
         if any(s is None for s in selectors):
             return None
 
-        # Look for schema list in cache, keyed by content type and
+        return self.lookup_selectors([(content_type, selectors)])[
+            (content_type, selectors)
+        ]
+
+    def lookup_selectors(self, keys):
+        """
+        Looks up the schema lists for many (content type, selectors)
+        pairs, using one cache round trip for all of them and a single
+        query for all cache misses.  Returns a map from each pair without
+        None selectors to its schema list.
+        """
+        keys = {(ct, tuple(selectors)) for ct, selectors in keys
+                if not any(s is None for s in selectors)}
+        generations = schema_generations({ct.pk for ct, _ in keys})
+
+        # Look for schema lists in cache, keyed by content type and
         # selector list.
-        key = schema_cache_key(content_type, selectors)
-        cached = caches['jsonattrs'].get(key)
-        if cached is not None:
-            return cached
-
-        # Not in cache: build schema list using increasing selector
-        # sequences.
-        base_schemas = self.filter(content_type=content_type)
-        schemas = []
-        for i in range(len(selectors) + 1):
-            schemas += list(base_schemas.filter(selectors=selectors[:i]))
-        caches['jsonattrs'].set(key, schemas)
-        return schemas
+        cache_keys = {schema_cache_key(k[0], k[1], generations): k
+                      for k in keys}
+        found = {cache_keys[k]: v
+                 for k, v in cache_get_many(list(cache_keys)).items()}
+        misses = [k for k in keys if k not in found]
+        if not misses:
+            return found
+
+        # Not in cache: build schema lists using increasing selector
+        # sequences, fetching all prefixes for all misses in a single
+        # query.
+        prefixes = {(ct.pk, tuple(str(s) for s in selectors[:i]))
+                    for ct, selectors in misses
+                    for i in range(len(selectors) + 1)}
+        condition = functools.reduce(operator.or_, [
+            models.Q(content_type_id=ct, selectors=list(prefix))
+            for ct, prefix in prefixes
+        ])
+        schemas = list(self.filter(condition))
+        prefetch_schema_attributes(schemas, generations)
+        by_prefix = {(s.content_type_id, tuple(s.selectors)): s
+                     for s in schemas}
+        new = {}
+        for ct, selectors in misses:
+            chain = [by_prefix.get((ct.pk, tuple(str(s) for s in
+                                                 selectors[:i])))
+                     for i in range(len(selectors) + 1)]
+            found[(ct, selectors)] = [s for s in chain if s is not None]
+            new[schema_cache_key(ct, selectors, generations)] = (
+                found[(ct, selectors)]
+            )
+        cache_set_many(new)
+        return found
+
+    def lookup_many(self, instances):
+        """
+        Looks up the schemata for many model instances at once, resolving
+        each distinct content type and selector list only once.  The
+        schemata and their composition are attached to each instance's
+        JSONAttributes, and a list of schema lists is returned in the
+        order of the instances.
+        """
+        instances = list(instances)
+        content_types = ContentType.objects.get_for_models(
+            *{type(i) for i in instances}
+        )
+        keys = []
+        for instance in instances:
+            content_type = content_types[type(instance)]
+            keys.append((content_type,
+                         self._get_selectors(instance, content_type)))
+        found = list(self.lookup_selectors(keys).items())
+        schemas = dict(found)
+        composed = dict(zip(
+            [k for k, _ in found],
+            composed_schemas_many([sl for _, sl in found])
+        ))
+
+        results = []
+        for instance, key in zip(instances, keys):
+            attrs = getattr(instance, '_attr_field', None)
+            if key in schemas and attrs is not None:
+                attrs.attach_schemas(schemas[key], composed[key], key[1])
+            results.append(schemas.get(key))
+        return results
 
     def from_instance(self, instance):
         return self.lookup(instance=instance)
 
+    def selector_paths(self, content_type):
+        return selector_config().paths[
+            (content_type.app_label, content_type.model)
+        ]
+
+    def selector_related_paths(self, content_type):
+        """
+        Returns the select_related paths needed to compute the selectors
+        of instances of a content type without further queries.
+        """
+        paths = []
+        for s in self.selector_paths(content_type):
+            steps = s.replace('.pk', '_id').split('.')[:-1]
+            if steps and '__'.join(steps) not in paths:
+                paths.append('__'.join(steps))
+        return paths
+
     def _get_selectors(self, instance, content_type=None):
         if content_type is None:
             content_type = ContentType.objects.get_for_model(instance)
 
-        # Lazily pre-process per-content type selector definitions.
-        if len(self.content_type_to_selectors) == 0:
-            for k, v in settings.JSONATTRS_SCHEMA_SELECTORS.items():
-                a, m = k.split('.')
-                self.content_type_to_selectors[
-                    ContentType.objects.get(app_label=a, model=m)
-                ] = v
-
-        # Build full list of selectors from instance.
-        selectors = []
-        for s in self.content_type_to_selectors[content_type]:
-            selector = instance
-            s = s.replace('.pk', '_id')
-            for step in s.split('.'):
-                selector = getattr(selector, step, None)
-            selectors.append(str(selector))
-        return tuple(selectors)
+        # Build full list of selectors from instance.  Selectors that
+        # cannot be computed (e.g. from null foreign keys) are None, and
+        # select no schemata.
+        values = (accessor(instance)
+                  for accessor in self.selector_accessors(content_type))
+        return tuple(None if v is None else str(v) for v in values)
+
+    def selector_accessors(self, content_type):
+        """
+        Returns the compiled accessor functions for the selector paths of
+        a content type.
+        """
+        return selector_config().accessors[
+            (content_type.app_label, content_type.model)
+        ]
 
 
 class Schema(models.Model):
@@ -97,11 +266,114 @@ class Schema(models.Model):
 
     def save(self, *args, **kwargs):
         super().save(*args, **kwargs)
-        SchemaManager.invalidate_cache()
+        SchemaManager.invalidate_cache(self.content_type_id)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        SchemaManager.invalidate_cache(self.content_type_id)
+        return result
 
     objects = SchemaManager()
 
 
+class ComposedSchema:
+    """
+    The effective schema for a combination of schemata: a read-only map of
+    attribute names to attributes, the names of required attributes and of
+    attributes with defaults, the defaults to fill in for required
+    attributes, the choice sets of attributes with choices, the names of
+    decimal attributes and compiled validators for all attributes.
+
+    Composed schemata are built once per schema combination and shared by
+    every JSONAttributes instance that resolves to it, so they must never
+    be modified.
+    """
+    __slots__ = ('attributes', 'required', 'defaults',
+                 'required_defaults', 'choices', 'decimals', 'validators')
+
+    def __init__(self, attrs, required_attrs, default_attrs):
+        self.attributes = MappingProxyType(attrs)
+        self.required = frozenset(required_attrs)
+        self.defaults = frozenset(default_attrs)
+        self.required_defaults = MappingProxyType(
+            {n: attrs[n].default for n in self.required & self.defaults}
+        )
+        self.choices = MappingProxyType(
+            {n: frozenset(a.choices) for n, a in attrs.items() if a.choices}
+        )
+        self.decimals = frozenset(n for n, a in attrs.items()
+                                  if a.attr_type.name == 'decimal')
+        self.validators = MappingProxyType(
+            {n: a.compile_validator() for n, a in attrs.items()}
+        )
+
+    def __reduce__(self):
+        return (ComposedSchema, (OrderedDict(self.attributes),
+                                 set(self.required), set(self.defaults)))
+
+    def validate(self, name, value):
+        self.validators[name](value)
+
+
+def composed_schema(*schemas):
+    """
+    Returns the ComposedSchema for the provided schemas.
+    """
+    return composed_schemas_many([schemas])[0]
+
+
+def composed_schemas_many(schema_lists):
+    """
+    Returns the ComposedSchema for each of a list of schema lists, using
+    one cache round trip and at most one attribute query for all of them.
+
+    Composed schemata are memoised per process under the same versioned
+    key as their cached attribute data, so schema changes invalidate both
+    together.
+    """
+    schema_lists = [tuple(sl) for sl in schema_lists]
+    generations = schema_generations(
+        {s.content_type_id for sl in schema_lists for s in sl}
+    )
+    keys = [compose_cache_key(sl, generations) for sl in schema_lists]
+    composed = {}
+    for key in keys:
+        memoised = composed_cache.get(key)
+        if memoised is not None:
+            composed[key] = memoised
+    missing = {k: sl for k, sl in zip(keys, schema_lists)
+               if k not in composed}
+    if not missing:
+        return [composed[k] for k in keys]
+
+    # For the sake of performance, composed attribute data is
+    # written-to and returned-from the jsonattrs cache.
+    cached = cache_get_many(list(missing))
+    if cached:
+        composed.update(_deserialize_composed(
+            {k: (missing[k], v) for k, v in cached.items()}
+        ))
+
+    build = {k: sl for k, sl in missing.items() if k not in cached}
+    if build:
+        prefetch_schema_attributes([s for sl in build.values() for s in sl],
+                                   generations)
+        serialized = {}
+        for key, sl in build.items():
+            attrs, required_attrs, default_attrs = _compose_attributes(sl)
+            composed[key] = ComposedSchema(attrs, required_attrs,
+                                           default_attrs)
+            # Serialize attrs to make it smaller in cache
+            s_attrs = OrderedDict((k, v.to_dict()) for k, v in attrs.items())
+            serialized[key] = (s_attrs, required_attrs, default_attrs)
+        cache_set_many(serialized)
+
+    for key in missing:
+        composed[key] = _memo_snapshot(composed[key])
+        composed_cache.set(key, composed[key], composed_cache_size())
+    return [composed[k] for k in keys]
+
+
 def compose_schemas(*schemas):
     """
     Returns a single three-ple of the following for all provided schemas:
@@ -109,21 +381,87 @@ def compose_schemas(*schemas):
         attributes
         - a set of names of all related required schema attributes
         - a set of names of all related default schema attributes
-    For the sake of performance, values are written-to and returned-from the
-    jsonattrs cache.
+    These are shared by all callers and must not be modified.
     """
-    key = 'jsonattrs:compose:' + ','.join([str(s.pk) for s in schemas])
-    cached = caches['jsonattrs'].get(key)
-    if cached:
-        s_attrs, required_attrs, default_attrs = cached
-        # Deserialize attrs when retrieving from cache
-        attrs = OrderedDict((k, Attribute(**v)) for k, v in s_attrs.items())
-        return attrs, required_attrs, default_attrs
+    composed = composed_schema(*schemas)
+    return composed.attributes, composed.required, composed.defaults
+
 
+def prefetch_schema_attributes(schemas, generations):
+    """
+    Loads the attributes and attribute types of schemas in a single
+    query, unless they were already loaded at the current schema
+    generation.  The generation is recorded on each schema, so that
+    attributes prefetched before a schema change are never composed.
+    """
+    stale = [s for s in schemas
+             if getattr(s, '_attributes_generation', None) !=
+             generations[s.content_type_id]]
+    if not stale:
+        return
+    for schema in stale:
+        getattr(schema, '_prefetched_objects_cache', {}).pop(
+            'attributes', None
+        )
+    models.prefetch_related_objects(stale, models.Prefetch(
+        'attributes',
+        queryset=Attribute.objects.select_related('attr_type')
+    ))
+    for schema in stale:
+        schema._attributes_generation = generations[schema.content_type_id]
+
+
+def _deserialize_composed(cached):
+    # Deserialize attrs when retrieving from cache, attaching their
+    # schemas and attribute types up front.
+    attr_types = AttributeType.objects.in_bulk({
+        v['attr_type_id'] for _, (s_attrs, _, _) in cached.values()
+        for v in s_attrs.values()
+    })
+    composed = {}
+    for key, (schemas, value) in cached.items():
+        s_attrs, required_attrs, default_attrs = value
+        attrs = OrderedDict((k, Attribute(**v)) for k, v in s_attrs.items())
+        schemas_by_pk = {s.pk: s for s in schemas}
+        for attr in attrs.values():
+            if attr.schema_id in schemas_by_pk:
+                attr.schema = schemas_by_pk[attr.schema_id]
+            attr.attr_type = attr_types[attr.attr_type_id]
+        composed[key] = ComposedSchema(attrs, required_attrs, default_attrs)
+    return composed
+
+
+def _memo_snapshot(composed):
+    # A copy of a composed schema for the process memo, which is shared
+    # between threads.  Its attributes and their schemata are detached
+    # from the schemata of the caller that built it, which are refreshed
+    # in place by prefetch_schema_attributes.
+    schema_field = Attribute._meta.get_field('schema')
+    content_type_field = Schema._meta.get_field('content_type')
+    schemas = {}
+    attrs = OrderedDict()
+    for name, attr in composed.attributes.items():
+        copy = Attribute(**attr.to_dict())
+        copy.attr_type = attr.attr_type
+        schema = _cached_related(schema_field, attr)
+        if schema is not None and schema is not _MISSING:
+            if schema.pk not in schemas:
+                schemas[schema.pk] = Schema(**{
+                    f.attname: getattr(schema, f.attname)
+                    for f in Schema._meta.concrete_fields
+                })
+                content_type = _cached_related(content_type_field, schema)
+                if content_type is not None and content_type is not _MISSING:
+                    schemas[schema.pk].content_type = content_type
+            copy.schema = schemas[schema.pk]
+        attrs[name] = copy
+    return ComposedSchema(attrs, composed.required, composed.defaults)
+
+
+def _compose_attributes(schemas):
     # Extract schema attributes, names of required attributes and
     # names of attributes with defaults, composing schemas.
-    schema_attrs = [
-        s.attributes.select_related('attr_type').all() for s in schemas]
+    schema_attrs = [s.attributes.all() for s in schemas]
     attrs = OrderedDict()
     required_attrs = set()
     default_attrs = set()
@@ -138,10 +476,6 @@ def compose_schemas(*schemas):
     required_attrs = {n for n, a in attrs.items() if a.required}
     default_attrs = {n for n, a in attrs.items()
                      if a.default is not None and a.default != ''}
-
-    # Serialize attrs to make it smaller in cache
-    s_attrs = OrderedDict((k, v.to_dict()) for k, v in attrs.items())
-    caches['jsonattrs'].set(key, (s_attrs, required_attrs, default_attrs))
     return attrs, required_attrs, default_attrs
 
 
@@ -154,6 +488,10 @@ def create_attribute_type(name, label, form_field,
         )
 
 
+class AttributeTypeQuerySet(SchemaCacheQuerySet):
+    content_type_lookup = 'attribute__schema__content_type_id'
+
+
 class AttributeType(models.Model):
     name = models.CharField(max_length=256)
     label = models.CharField(max_length=512)
@@ -162,9 +500,19 @@ class AttributeType(models.Model):
     validator_re = models.CharField(max_length=512, null=True, blank=True)
     validator_type = models.CharField(max_length=256, null=True, blank=True)
 
+    objects = AttributeTypeQuerySet.as_manager()
+
     def __str__(self):
         return self.label
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        AttributeType.objects.filter(pk=self.pk).invalidate_cache()
+
+    def delete(self, *args, **kwargs):
+        AttributeType.objects.filter(pk=self.pk).invalidate_cache()
+        return super().delete(*args, **kwargs)
+
 
 def create_attribute_types():
     create_attribute_type('boolean', 'Boolean', 'BooleanField',
@@ -195,36 +543,53 @@ def create_attribute_types():
     create_attribute_type('foreign_key', 'Select one:', 'ModelChoiceField')
 
 
-# Sigh.  Oh Python.  Really?  Why?  Is there really no other way to
-# look up a class by name than to manually calculate the transitive
-# closure of the subclass relationship starting from "object"?
-
-def desc_classes(c):
-    try:
-        scs = c.__subclasses__()
-        sscs = []
-        for sc in scs:
-            sscs += desc_classes(sc)
-        scs += sscs
-        return scs
-    except TypeError:
-        return []
+# Python types that attribute types can name as their validator_type.
+# Apps can add their own with register_validator_type, typically from
+# AppConfig.ready.
+VALIDATOR_TYPES = {
+    'bool': bool,
+    'str': str,
+    'int': int,
+    'float': float,
+    'Decimal': Decimal,
+    'date': datetime.date,
+    'datetime': datetime.datetime,
+    'time': datetime.time,
+    'list': list,
+    'dict': dict,
+}
 
 
-class_cache = None
+def register_validator_type(name, cls):
+    if VALIDATOR_TYPES.get(name, cls) is not cls:
+        raise ValueError("validator type '{}' is already registered "
+                         "as {!r}".format(name, VALIDATOR_TYPES[name]))
+    VALIDATOR_TYPES[name] = cls
 
 
 def find_class(name):
-    global class_cache
+    try:
+        return VALIDATOR_TYPES[name]
+    except KeyError:
+        raise ValueError("Unknown validator type: '{}'".format(name))
+
+
+# Values treated as empty, and the attribute types for which empty values
+# are validated as None.
+EMPTY_VALUES = ('', [''], )
+EMPTY_AS_NONE_TYPES = frozenset(('integer', 'decimal',
+                                 'select_one', 'select_multiple'))
+
 
-    if class_cache is None:
-        class_cache = desc_classes(object)
-    return [c for c in class_cache if c.__name__ == name][0]
+class AttributeQuerySet(SchemaCacheQuerySet):
+    content_type_lookup = 'schema__content_type_id'
 
 
 class AttributeManager(models.Manager):
+    def get_queryset(self):
+        return AttributeQuerySet(self.model, using=self._db)
+
     def create(self, *args, **kwargs):
-        SchemaManager.invalidate_cache()
         choices = kwargs.get('choices', None)
         choice_labels = kwargs.get('choice_labels', None)
         if choices is not None and choices != []:
@@ -249,6 +614,16 @@ class AttributeManager(models.Manager):
         return super().create(*args, **kwargs)
 
 
+# Kinds of database index that can be declared for an attribute: a B-tree
+# index on the attribute's typed value (see transforms.TYPED_CASTS), or a
+# GIN index on its JSON value, e.g. for containment queries on lists.
+INDEX_TYPES = (
+    ('', _('None')),
+    ('btree', _('B-tree')),
+    ('gin', _('GIN')),
+)
+
+
 class Attribute(models.Model):
     schema = models.ForeignKey(
         Schema, related_name='attributes', on_delete=models.CASCADE
@@ -262,6 +637,8 @@ class Attribute(models.Model):
     default = models.CharField(max_length=256, blank=True)
     required = models.BooleanField(default=False)
     omit = models.BooleanField(default=False)
+    index_type = models.CharField(max_length=8, blank=True, default='',
+                                  choices=INDEX_TYPES)
 
     class Meta:
         ordering = ('schema', 'index')
@@ -275,6 +652,26 @@ class Attribute(models.Model):
     def __repr__(self):
         return str(self)
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        SchemaManager.invalidate_cache(self._content_type_id())
+
+    def delete(self, *args, **kwargs):
+        content_type_id = self._content_type_id()
+        result = super().delete(*args, **kwargs)
+        SchemaManager.invalidate_cache(content_type_id)
+        return result
+
+    def _content_type_id(self):
+        # The schema is only loaded to find its content type if nothing
+        # else has loaded it already.
+        schema = _cached_related(self._meta.get_field('schema'), self)
+        if schema is not None and schema is not _MISSING:
+            return schema.content_type_id
+        return Schema.objects.filter(pk=self.schema_id).values_list(
+            'content_type_id', flat=True
+        ).first()
+
     @property
     def long_name(self):
         if self.long_name_xlat is None or isinstance(self.long_name_xlat, str):
@@ -305,49 +702,68 @@ class Attribute(models.Model):
         self.choice_labels_xlat = value
 
     def validate(self, value):
-        empty_vals = ('', [''], )
-
-        if (self.required and self.default == '' and
-           (value is None or value in empty_vals)):
-            raise ValidationError(
-                _('Missing required field %(field)s'),
-                params={'field': self.name}
-            )
-
+        self.compile_validator()(value)
+
+    def compile_validator(self):
+        """
+        Returns a function that validates values for this attribute, with
+        everything that depends only on the attribute and its type worked
+        out in advance.
+        """
+        name = self.name
         atype = self.attr_type
-        if (value in empty_vals and
-                atype.name in ('integer', 'decimal', 'select_one',
-                               'select_multiple')):
-            value = None
-
-        if self.choices is not None and self.choices != [] and value:
-            if type(value) == list:
-                for v in value:
-                    if v not in self.choices:
-                        raise ValidationError(
-                            _('Invalid choice for %(field)s: "%(value)s"'),
-                            params={'field': self.name, 'value': v}
-                        )
-            elif value not in self.choices:
+        missing_if_empty = self.required and self.default == ''
+        empty_is_none = atype.name in EMPTY_AS_NONE_TYPES
+        choices = (frozenset(self.choices)
+                   if self.choices is not None and self.choices != []
+                   else None)
+        regex = (re.compile(atype.validator_re)
+                 if atype.validator_re is not None else None)
+        vtype = (find_class(atype.validator_type)
+                 if atype.validator_type is not None else None)
+
+        def check_choice(value):
+            try:
+                valid = value in choices
+            except TypeError:
+                valid = False
+            if not valid:
                 raise ValidationError(
                     _('Invalid choice for %(field)s: "%(value)s"'),
-                    params={'field': self.name, 'value': value}
+                    params={'field': name, 'value': value}
                 )
 
-        if isinstance(value, str):
-            if (atype.validator_re is not None and
-               re.match(atype.validator_re, value) is None):
+        def validate(value):
+            if missing_if_empty and (value is None or value in EMPTY_VALUES):
                 raise ValidationError(
-                    _('Validation failed for %(field)s: "%(value)s"'),
-                    params={'field': self.name, 'value': value}
+                    _('Missing required field %(field)s'),
+                    params={'field': name}
                 )
-        elif atype.validator_type is not None:
-            if not isinstance(value, find_class(atype.validator_type)):
+
+            if empty_is_none and value in EMPTY_VALUES:
+                value = None
+
+            if choices is not None and value:
+                if type(value) == list:
+                    for v in value:
+                        check_choice(v)
+                else:
+                    check_choice(value)
+
+            if isinstance(value, str):
+                if regex is not None and regex.match(value) is None:
+                    raise ValidationError(
+                        _('Validation failed for %(field)s: "%(value)s"'),
+                        params={'field': name, 'value': value}
+                    )
+            elif vtype is not None and not isinstance(value, vtype):
                 raise ValidationError(
                     _('Validation failed for %(field)s: "%(value)s"'),
-                    params={'field': self.name, 'value': value}
+                    params={'field': name, 'value': value}
                 )
 
+        return validate
+
     @property
     def choice_dict(self):
         if self.choices is None or self.choices == []:
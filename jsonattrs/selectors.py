@@ -0,0 +1,322 @@
+from collections import namedtuple
+import threading
+import time
+from types import MappingProxyType
+
+from django.apps import apps
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db.models.signals import post_delete, post_save
+
+from .cache import selector_cache, selector_cache_size, selector_cache_ttl
+
+
+# JSONATTRS_SCHEMA_SELECTORS paths are compiled once per model into
+# accessor functions.  A path ending in a foreign key followed by "pk"
+# reads the key's attname (e.g. "project_id") without loading the related
+# object.  Longer paths follow related objects already cached on the
+# instance, and otherwise compute the rest of the path with a single
+# values_list() query from the first related key, memoised in
+# selector_cache for a short time.
+
+_MISSING = object()
+
+
+def compile_selector(model, path):
+    """
+    Compiles a selector path like "project.organization.pk" into a
+    function returning the selector value for an instance of ``model``.
+    """
+    return _compile_steps(model, path.split('.'))
+
+
+def _forward_field(model, name):
+    try:
+        field = model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+    if field.is_relation and not (
+            field.many_to_one or (field.one_to_one and field.concrete)):
+        return None
+    return field
+
+
+def _attribute_chain(steps):
+    def accessor(obj):
+        for step in steps:
+            obj = getattr(obj, step, None)
+        return obj
+    return accessor
+
+
+def _lookup_path(model, steps):
+    """
+    Returns the values_list() lookup for a path of model fields, or None
+    if the path does not end in a plain value.
+    """
+    lookups = []
+    for i, step in enumerate(steps):
+        last = i == len(steps) - 1
+        if step == 'pk' and last:
+            lookups.append('pk')
+            break
+        field = _forward_field(model, step)
+        if field is None:
+            return None
+        if field.is_relation:
+            if last:
+                return None
+            model = field.related_model
+        elif not last:
+            return None
+        lookups.append(step)
+    return '__'.join(lookups)
+
+
+def _compile_steps(model, steps):
+    step, rest = steps[0], steps[1:]
+    if step == 'pk' and not rest:
+        return _attribute_chain(steps)
+    field = _forward_field(model, step)
+    if field is None or not field.is_relation or not rest:
+        return _attribute_chain(steps)
+
+    target = field.target_field
+    if len(rest) == 1 and (
+            rest[0] == target.name or
+            (rest[0] == 'pk' and target.primary_key)):
+        return _attribute_chain([field.attname])
+
+    related_model = field.related_model
+    nested = _compile_steps(related_model, rest)
+    lookup = _lookup_path(related_model, rest)
+    if lookup is not None:
+        _watch_path(related_model, rest)
+
+    def accessor(obj):
+        value = getattr(obj, field.attname)
+        if value is None:
+            return None
+        related = _cached_related(field, obj)
+        if (related is not _MISSING and related is not None and
+                getattr(related, target.attname) == value):
+            return nested(related)
+        if lookup is None:
+            return nested(getattr(obj, field.name))
+        return _join_lookup(related_model, target, value, lookup,
+                            obj._state.db)
+    return accessor
+
+
+def _cached_related(field, obj):
+    # Django 2.0 keeps related objects in a per-instance field cache;
+    # Django 1.11 stores them as attributes named by get_cache_name().
+    fields_cache = getattr(obj._state, 'fields_cache', None)
+    if fields_cache is not None:
+        return fields_cache.get(field.get_cache_name(), _MISSING)
+    return getattr(obj, field.get_cache_name(), _MISSING)
+
+
+def _join_lookup(model, target, value, lookup, using):
+    key = (model._meta.label_lower, value, lookup)
+    now = time.monotonic()
+    found = selector_cache.get(key)
+    if found is not None and found[1] > now:
+        return found[0]
+    rows = list(model._base_manager.using(using)
+                .filter(**{target.name: value}).order_by()
+                .values_list(lookup, flat=True)[:1])
+    result = rows[0] if rows else None
+    ttl = selector_cache_ttl()
+    if ttl > 0:
+        selector_cache.set(key, (result, now + ttl), selector_cache_size())
+    return result
+
+
+def _watch_path(model, steps):
+    # Any change to a model along a join lookup path may change memoised
+    # selector values.
+    for step in steps:
+        post_save.connect(_clear_selector_cache, sender=model, weak=False,
+                          dispatch_uid='jsonattrs_selectors')
+        post_delete.connect(_clear_selector_cache, sender=model, weak=False,
+                            dispatch_uid='jsonattrs_selectors')
+        field = _forward_field(model, step)
+        if field is None or not field.is_relation:
+            break
+        model = field.related_model
+
+
+def _clear_selector_cache(sender, **kwargs):
+    selector_cache.clear()
+
+
+# The selector configuration maps (app_label, model) natural keys, as found
+# on ContentType instances, to the selector paths from settings and their
+# compiled accessors.  It is built by the app config at startup and only
+# ever replaced as a whole, so readers never see a partial configuration.
+
+SelectorConfig = namedtuple('SelectorConfig',
+                            ('paths', 'accessors', 'sources'))
+
+_config = None
+_config_lock = threading.Lock()
+
+
+def build_selector_config(selectors):
+    """
+    Validates a JSONATTRS_SCHEMA_SELECTORS setting and returns the
+    corresponding SelectorConfig.
+    """
+    paths = {}
+    accessors = {}
+    sources = {}
+    for key, model_paths in selectors.items():
+        try:
+            app_label, model_name = key.split('.')
+            model = apps.get_model(app_label, model_name)
+        except (ValueError, LookupError):
+            raise ImproperlyConfigured(
+                "JSONATTRS_SCHEMA_SELECTORS: unknown model '{}'".format(key)
+            )
+        if isinstance(model_paths, str) or not all(
+                isinstance(p, str) and p for p in model_paths):
+            raise ImproperlyConfigured(
+                "JSONATTRS_SCHEMA_SELECTORS: selectors for '{}' must be a "
+                "sequence of attribute paths".format(key)
+            )
+        natural_key = (model._meta.app_label, model._meta.model_name)
+        paths[natural_key] = tuple(model_paths)
+        accessors[natural_key] = tuple(compile_selector(model, p)
+                                       for p in model_paths)
+        sources[natural_key] = _source_attnames(model, model_paths)
+    return SelectorConfig(MappingProxyType(paths),
+                          MappingProxyType(accessors),
+                          MappingProxyType(sources))
+
+
+def selector_field(model, path):
+    """
+    Returns the concrete local field holding the value of a selector path,
+    or None if the value comes from elsewhere.
+    """
+    steps = path.split('.')
+    if steps == ['pk']:
+        return model._meta.pk
+    field = _forward_field(model, steps[0])
+    if field is None or not field.concrete:
+        return None
+    if len(steps) == 1 and not field.is_relation:
+        return field
+    if field.is_relation and len(steps) == 2:
+        target = field.target_field
+        if (steps[1] == target.name or
+                (steps[1] == 'pk' and target.primary_key)):
+            return field
+    return None
+
+
+def _source_attnames(model, paths):
+    """
+    Returns the attnames of the local fields that selector paths start
+    from, or None if some path does not start from a concrete field.
+    """
+    attnames = []
+    for path in paths:
+        step = path.split('.')[0]
+        if step == 'pk':
+            field = model._meta.pk
+        else:
+            field = _forward_field(model, step)
+            if field is None or not field.concrete:
+                return None
+        if field.attname not in attnames:
+            attnames.append(field.attname)
+    return tuple(attnames)
+
+
+def selector_source_values(instance):
+    """
+    Returns the current values of the fields that an instance's selectors
+    are computed from, or None if they are not known.
+    """
+    opts = instance._meta
+    sources = selector_config().sources.get(
+        (opts.app_label, opts.model_name)
+    )
+    if sources is None:
+        return None
+    data = instance.__dict__
+    return tuple(data.get(attname, _MISSING) for attname in sources)
+
+
+def load_selector_config():
+    """
+    Builds the selector configuration from settings and makes it current.
+    Called when the app is ready, and again when the setting changes
+    (e.g. under override_settings in tests).
+    """
+    global _config
+    with _config_lock:
+        _config = build_selector_config(
+            getattr(settings, 'JSONATTRS_SCHEMA_SELECTORS', {})
+        )
+    return _config
+
+
+def selector_config():
+    config = _config
+    if config is None:
+        config = load_selector_config()
+    return config
+
+
+def _selectors_setting_changed(setting, **kwargs):
+    if setting == 'JSONATTRS_SCHEMA_SELECTORS':
+        load_selector_config()
+
+
+setting_changed.connect(_selectors_setting_changed)
+
+
+# The values of selector source fields are recorded on model instances as
+# they are loaded, so that saves can tell whether selectors may have
+# changed without computing them.
+
+SOURCES_KEY = '_jsonattrs_selector_sources'
+
+
+def record_selector_sources(instance):
+    instance.__dict__[SOURCES_KEY] = selector_source_values(instance)
+
+
+def forget_selector_sources(instance):
+    instance.__dict__.pop(SOURCES_KEY, None)
+
+
+def selector_check_needed(instance, attrs_field, update_fields=None):
+    """
+    Returns whether saving an instance needs the schema selector check,
+    i.e. whether it is new, or saves changed selector source fields, or
+    saves attributes that were replaced since loading.
+    """
+    if instance._state.adding:
+        return True
+    recorded = instance.__dict__.get(SOURCES_KEY)
+    if recorded is None:
+        return True
+    current = selector_source_values(instance)
+    changed = [i for i, (c, r) in enumerate(zip(current, recorded))
+               if c != r]
+    if not changed or update_fields is None:
+        return bool(changed)
+    if attrs_field in update_fields:
+        return True
+
+    # Only the selector source fields that are saved matter.
+    opts = instance._meta
+    sources = selector_config().sources[(opts.app_label, opts.model_name)]
+    names = {f.attname: f.name for f in opts.concrete_fields}
+    return any(sources[i] in update_fields or
+               names[sources[i]] in update_fields for i in changed)
@@ -0,0 +1,111 @@
+from collections import namedtuple
+
+from django.contrib.postgres.fields.jsonb import KeyTransform
+from django.db import models
+from django.db.models import F, Transform
+
+
+# Typed attribute transforms: attrs__int__area, attrs__date__survey_date,
+# etc. cast the text value of an attribute to a SQL type, so that range
+# filters and ordering compare values rather than JSON text.  Each type
+# has a single canonical SQL expression, also used for the expression
+# indexes that jsonattrs creates, so that the planner can match queries
+# to indexes.  Empty strings, which attributes use for missing values,
+# are cast as NULL.
+#
+# Values that do not parse as their type are cast as NULL rather than
+# raising an error, so that one bad value cannot break queries or index
+# builds.  The casts go through the immutable jsonattrs_* functions
+# created by jsonattrs' migrations, which can also be used in index
+# expressions: dates and timestamps are parsed from their ISO 8601 fields,
+# independently of the DateStyle and TimeZone settings, and timestamps
+# with a UTC offset are converted to UTC.
+
+TypedCast = namedtuple('TypedCast', ('template', 'output_field'))
+
+TYPED_CASTS = {
+    'text': TypedCast('{}', models.TextField),
+    'int': TypedCast('jsonattrs_int({})', models.BigIntegerField),
+    'dec': TypedCast('jsonattrs_numeric({})', models.DecimalField),
+    'float': TypedCast('jsonattrs_float({})', models.FloatField),
+    'bool': TypedCast('jsonattrs_bool({})', models.BooleanField),
+    'date': TypedCast('jsonattrs_date({})', models.DateField),
+    'datetime': TypedCast('jsonattrs_timestamp({})', models.DateTimeField),
+}
+
+# Casts used for the values of each attribute type.
+ATTRIBUTE_TYPE_CASTS = {
+    'boolean': 'bool',
+    'integer': 'int',
+    'decimal': 'dec',
+    'date': 'date',
+    'dateTime': 'datetime',
+}
+
+
+def attribute_type_cast(attr_type_name):
+    return ATTRIBUTE_TYPE_CASTS.get(attr_type_name, 'text')
+
+
+def typed_key_sql(column_sql, cast):
+    """
+    Returns the canonical SQL expression for an attribute of a jsonb
+    column cast to a type.  The attribute name is a query parameter.
+    """
+    return TYPED_CASTS[cast].template.format(
+        '({} ->> %s)'.format(column_sql)
+    )
+
+
+class TypedKeyTransform(Transform):
+    """
+    The value of an attribute cast to one of the TYPED_CASTS types.
+    """
+    def __init__(self, key_name, cast, *args, **kwargs):
+        kwargs.setdefault('output_field', TYPED_CASTS[cast].output_field())
+        super().__init__(*args, **kwargs)
+        self.key_name = key_name
+        self.cast = cast
+
+    def as_sql(self, compiler, connection):
+        lhs = self.lhs
+        if isinstance(lhs, TypedKeysTransform):
+            lhs = lhs.lhs
+        sql, params = compiler.compile(lhs)
+        return (typed_key_sql(sql, self.cast),
+                list(params) + [self.key_name])
+
+
+class TypedKeysTransform(KeyTransform):
+    """
+    The "int" in attrs__int__area.  Followed by an attribute name, this
+    gives the typed value of the attribute; on its own, it is the value
+    of an attribute called "int", as for any other JSON key.
+    """
+    def get_transform(self, name):
+        return TypedKeyTransformFactory(name, self.key_name)
+
+
+class TypedKeysTransformFactory:
+    def __init__(self, cast):
+        self.cast = cast
+
+    def __call__(self, *args, **kwargs):
+        return TypedKeysTransform(self.cast, *args, **kwargs)
+
+
+class TypedKeyTransformFactory:
+    def __init__(self, key_name, cast):
+        self.key_name = key_name
+        self.cast = cast
+
+    def __call__(self, *args, **kwargs):
+        return TypedKeyTransform(self.key_name, self.cast, *args, **kwargs)
+
+
+def typed_key(field_name, key_name, cast):
+    """
+    Expression for the typed value of an attribute, for use in annotate()
+    and order_by(), e.g. order_by(typed_key('attrs', 'area', 'int')).
+    """
+    return TypedKeyTransform(key_name, cast, F(field_name))
@@ -0,0 +1,211 @@
+from collections import namedtuple
+import hashlib
+import re
+
+from django.core.exceptions import EmptyResultSet
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from .evolution import schema_queryset
+from .indexes import attribute_models
+from .models import Schema, composed_schema
+from .transforms import TYPED_CASTS, attribute_type_cast
+
+
+# Typed SQL views of attribute data for reporting, one per schema, created
+# by sync_views (or the syncattrviews management command).  A schema's view
+# has the model's columns and one column per attribute of its composed
+# schema, cast to the SQL type for the attribute type, over the rows the
+# schema applies to.  Values that do not parse as their type read as NULL,
+# so that one bad value cannot break queries on the view.  View names end
+# with a hash of the table and selectors, so that selectors that read the
+# same once made into an identifier still have views of their own.
+#
+# Views can be materialized, with a unique index on the primary key so
+# that they can be refreshed concurrently.  Each view is commented with a
+# hash of its definition: views whose definition is unchanged are only
+# refreshed, others are dropped and recreated.
+
+VIEW_PREFIX = 'jsonattrs_v_'
+
+# Attribute types whose values are lists, exposed as text[] columns.
+ARRAY_TYPES = frozenset(('select_multiple',))
+
+AttributeView = namedtuple('AttributeView',
+                           ('name', 'materialized', 'sql', 'digest', 'key'))
+
+SyncResult = namedtuple('SyncResult', ('created', 'refreshed', 'dropped'))
+
+
+def _view_name(table, selectors):
+    # At most 60 characters, leaving room for the "_pk" index suffix.
+    digest = hashlib.md5(
+        repr((table, list(selectors))).encode('utf-8')
+    ).hexdigest()[:8]
+    name = '_'.join([VIEW_PREFIX + table] + list(selectors))
+    name = re.sub(r'\W', '_', name, flags=re.ASCII).lower()
+    return name[:51] + '_' + digest
+
+
+def _truncate(name, size):
+    # PostgreSQL truncates identifiers to 63 bytes.
+    return name.encode('utf-8')[:size].decode('utf-8', 'ignore')
+
+
+def _column_alias(name, used):
+    alias = _truncate(name, 63)
+    suffix = 1
+    while alias in used:
+        suffix += 1
+        tail = '_{}'.format(suffix)
+        alias = _truncate(name, 63 - len(tail)) + tail
+    used.add(alias)
+    return alias
+
+
+def _column_sql(col, attr):
+    # The SQL for the typed value of an attribute, with the attribute
+    # name as parameters.
+    if attr.attr_type.name in ARRAY_TYPES:
+        # Scalars become one-element arrays.
+        return ("ARRAY(SELECT jsonb_array_elements_text(CASE WHEN "
+                "jsonb_typeof({col} -> %s) = 'array' THEN {col} -> %s "
+                "ELSE jsonb_build_array({col} ->> %s) END) value "
+                "WHERE value <> '')".format(col=col),
+                [attr.name, attr.name, attr.name])
+    cast = attribute_type_cast(attr.attr_type.name)
+    value = '({} ->> %s)'.format(col)
+    return TYPED_CASTS[cast].template.format(value), [attr.name]
+
+
+def schema_view(schema, materialized=False, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the AttributeView for a schema, or None if the schema cannot
+    apply to any row.
+    """
+    connection = connections[using]
+    qn = connection.ops.quote_name
+    queryset = schema_queryset(schema, using)
+    try:
+        scope_sql, scope_params = (queryset.values('pk').query
+                                   .sql_with_params())
+    except EmptyResultSet:
+        return None
+    model = queryset.model
+    attr_field = model._meta.get_field(model._attr_field_name)
+    col = 'rows.' + qn(attr_field.column)
+
+    schemas = Schema.objects.db_manager(using).lookup_selectors(
+        [(schema.content_type, schema.selectors)]
+    ).get((schema.content_type, tuple(schema.selectors)), [schema])
+    composed = composed_schema(*schemas)
+
+    columns = [f.column for f in model._meta.concrete_fields
+               if f is not attr_field]
+    select = ['rows.' + qn(c) for c in columns]
+    used = set(columns)
+    params = []
+    for name, attr in composed.attributes.items():
+        sql, attr_params = _column_sql(col, attr)
+        alias = name if name not in columns else attr_field.column + '_' + name
+        select.append('{} AS {}'.format(sql, qn(_column_alias(alias, used))))
+        params.extend(attr_params)
+    sql = 'SELECT {} FROM {} rows WHERE rows.{} IN ({})'.format(
+        ', '.join(select), qn(model._meta.db_table),
+        qn(model._meta.pk.column), scope_sql
+    )
+    with connection.cursor() as cursor:
+        sql = cursor.cursor.mogrify(sql, params + list(scope_params))
+    sql = sql.decode('utf-8') if isinstance(sql, bytes) else sql
+    digest = hashlib.md5(
+        '{}:{}'.format(materialized, sql).encode('utf-8')
+    ).hexdigest()
+    return AttributeView(_view_name(model._meta.db_table, schema.selectors),
+                         materialized, sql, digest, model._meta.pk.column)
+
+
+def attribute_views(materialized=False, using=DEFAULT_DB_ALIAS):
+    """
+    Returns the views for all schemata of models with attributes, as a
+    map from view names to AttributeView tuples.
+    """
+    attr_models = set(attribute_models())
+    schemas = (Schema.objects.using(using).select_related('content_type')
+               .order_by('content_type', 'selectors'))
+    views = {}
+    for schema in schemas:
+        if schema.content_type.model_class() not in attr_models:
+            continue
+        view = schema_view(schema, materialized, using)
+        if view is not None:
+            views[view.name] = view
+    return views
+
+
+def existing_views(using=DEFAULT_DB_ALIAS):
+    """
+    Returns the jsonattrs views in the database, as a map from view names
+    to (materialized, digest) pairs.
+    """
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            "SELECT c.relname, c.relkind = 'm', "
+            "obj_description(c.oid, 'pg_class') FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = current_schema() AND c.relkind IN ('v', 'm') "
+            "AND c.relname LIKE %s",
+            [VIEW_PREFIX.replace('_', '\\_') + '%']
+        )
+        return {name: (materialized, comment)
+                for name, materialized, comment in cursor.fetchall()}
+
+
+def _drop_view(cursor, qn, name, materialized):
+    cursor.execute('DROP {}VIEW IF EXISTS {}'.format(
+        'MATERIALIZED ' if materialized else '', qn(name)
+    ))
+
+
+def _create_view(cursor, qn, view):
+    kind = 'MATERIALIZED VIEW' if view.materialized else 'VIEW'
+    cursor.execute('CREATE {} {} AS {}'.format(kind, qn(view.name), view.sql))
+    cursor.execute('COMMENT ON {} {} IS %s'.format(kind, qn(view.name)),
+                   [view.digest])
+    if view.materialized:
+        # Concurrent refreshes need a unique index.
+        cursor.execute('CREATE UNIQUE INDEX {} ON {} ({})'.format(
+            qn(view.name + '_pk'), qn(view.name), qn(view.key)
+        ))
+
+
+def sync_views(materialized=False, refresh=True, concurrently=False,
+               using=DEFAULT_DB_ALIAS, dry_run=False):
+    """
+    Creates or replaces the views of all schemata, drops jsonattrs views
+    of schemata that no longer exist and, if ``refresh``, refreshes the
+    materialized views that are unchanged.  Returns a SyncResult with the
+    lists of created, refreshed and dropped view names.
+    """
+    desired = attribute_views(materialized, using)
+    existing = existing_views(using)
+    drop = sorted(name for name, (mat, digest) in existing.items()
+                  if name not in desired or desired[name].digest != digest)
+    create = sorted(name for name in desired
+                    if name not in existing or name in drop)
+    refreshed = sorted(name for name, view in desired.items()
+                       if refresh and view.materialized and
+                       name not in create)
+    if not dry_run:
+        connection = connections[using]
+        qn = connection.ops.quote_name
+        with transaction.atomic(using=using):
+            with connection.cursor() as cursor:
+                for name in drop:
+                    _drop_view(cursor, qn, name, existing[name][0])
+                for name in create:
+                    _create_view(cursor, qn, desired[name])
+        with connection.cursor() as cursor:
+            for name in refreshed:
+                cursor.execute('REFRESH MATERIALIZED VIEW {}{}'.format(
+                    'CONCURRENTLY ' if concurrently else '', qn(name)
+                ))
+    return SyncResult(create, refreshed, drop)
@@ -87,6 +87,9 @@ setup(
         'Django>=1.11,<2.1',
         'django-audit-log==0.7.0'
     ],
+    extras_require={
+        'orjson': ['orjson; python_version >= "3.6"'],
+    },
     classifiers=[
         'Development Status :: 3 - Alpha',
         'Environment :: Web Environment',
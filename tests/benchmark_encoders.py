@@ -0,0 +1,44 @@
+"""
+Compare JSON encoder backends on realistic attribute payloads:
+
+    python -m tests.benchmark_encoders
+"""
+import timeit
+from datetime import date, datetime
+from decimal import Decimal
+
+from jsonattrs import encoders
+
+
+def payload(i):
+    return {
+        'name': 'Party #{}'.format(i),
+        'dob': date(1950 + i % 50, 1 + i % 12, 1 + i % 28),
+        'gender': 'female' if i % 2 else 'male',
+        'education': 'Secondary school',
+        'homeowner': bool(i % 3),
+        'household_size': i % 9,
+        'income': Decimal('{}.{:02d}'.format(i * 17, i % 100)),
+        'area': i * 0.75,
+        'quality': 'polygon_high',
+        'infrastructure': ['water', 'transportation', 'food'][:i % 4],
+        'notes': 'Surveyed by field team {} '.format(i % 7) * 8,
+        'updated': datetime(2017, 1, 12, 13, 6, i % 60),
+    }
+
+
+def main(rows=10000, repeat=5):
+    payloads = [payload(i) for i in range(rows)]
+    for name, dumps in sorted(encoders.BACKENDS.items()):
+        if name == 'orjson' and encoders.orjson is None:
+            print('{:8} not installed'.format(name))
+            continue
+        best = min(timeit.repeat(lambda: [dumps(p) for p in payloads],
+                                 number=1, repeat=repeat))
+        print('{:8} {:8.1f} ms for {} rows ({:.1f} us/row)'.format(
+            name, best * 1000, rows, best * 1e6 / rows
+        ))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,3 +1,6 @@
+import pytest
+
+
 def pytest_configure():
     from django.conf import settings
 
@@ -82,3 +85,11 @@ def pytest_configure():
         django.setup()
     except AttributeError:
         pass
+
+
+@pytest.fixture(autouse=True)
+def clear_jsonattrs_cache():
+    # Test transactions are rolled back but the schema cache isn't, so
+    # make sure no test sees schemata cached by an earlier one.
+    from jsonattrs.cache import cache_clear
+    cache_clear()
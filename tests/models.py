@@ -7,10 +7,9 @@ except ImportError:
 from django.db import models
 
 from jsonattrs.fields import JSONAttributeField
-from jsonattrs.decorators import fix_model_for_attributes
+from jsonattrs.managers import JSONAttributesManager
 
 
-@fix_model_for_attributes
 class Organization(models.Model):
     name = models.CharField(max_length=100)
     attrs = JSONAttributeField()
@@ -22,7 +21,6 @@ class Organization(models.Model):
         return self.name
 
 
-@fix_model_for_attributes
 class Project(models.Model):
     name = models.CharField(max_length=100)
     organization = models.ForeignKey(Organization, on_delete=models.CASCADE)
@@ -35,12 +33,13 @@ class Project(models.Model):
         return self.name
 
 
-@fix_model_for_attributes
 class Party(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     name = models.CharField(max_length=100)
     attrs = JSONAttributeField()
 
+    objects = JSONAttributesManager()
+
     class Meta:
         ordering = ('project', 'name')
 
@@ -51,13 +50,14 @@ class Party(models.Model):
         return reverse('party-detail', kwargs={'pk': self.pk})
 
 
-@fix_model_for_attributes
 class Parcel(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE)
     type = models.CharField(max_length=20)
     address = models.CharField(max_length=200)
     attrs = JSONAttributeField()
 
+    objects = JSONAttributesManager()
+
     class Meta:
         ordering = ('project', 'address')
 
@@ -68,7 +68,6 @@ class Parcel(models.Model):
         return reverse('parcel-detail', kwargs={'pk': self.pk})
 
 
-@fix_model_for_attributes
 class Labelled(models.Model):
     label = models.CharField(max_length=64)
     name = models.CharField(max_length=64)
@@ -0,0 +1,92 @@
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+
+from jsonattrs.cache import (
+    LocalCache, local_cache, generation_cache_key, schema_generation
+)
+from jsonattrs.models import Attribute, Schema, schema_cache_key
+
+from .fixtures import create_fixtures
+
+
+def test_local_cache_lru_eviction():
+    cache = LocalCache()
+    cache.set('a', 1, 2)
+    cache.set('b', 2, 2)
+    assert cache.get('a') == 1
+    cache.set('c', 3, 2)
+    assert len(cache) == 2
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+
+
+@override_settings(JSONATTRS_LOCAL_CACHE_SIZE=10,
+                   JSONATTRS_LOCAL_CACHE_TTL=60)
+class LocalCacheTierTest(TestCase):
+    def setUp(self):
+        self.fixtures = create_fixtures(do_schemas=False)
+        self.party_t = self.fixtures['party_t']
+        self.schema = Schema.objects.create(content_type=self.party_t,
+                                            selectors=())
+
+    def lookup(self):
+        return Schema.objects.lookup(content_type=self.party_t,
+                                     selectors=('1',))
+
+    def test_lookup_served_locally(self):
+        schemas = self.lookup()
+        assert schemas == [self.schema]
+        key = schema_cache_key(self.party_t, ('1',))
+        assert local_cache.get(key) is schemas
+
+        # Hits don't touch the shared backend.
+        caches['jsonattrs'].delete(key)
+        with self.assertNumQueries(0):
+            assert self.lookup() is schemas
+
+    def test_local_writes_seen_immediately(self):
+        assert self.lookup() == [self.schema]
+        schema = Schema.objects.create(content_type=self.party_t,
+                                       selectors=('1',))
+        assert self.lookup() == [self.schema, schema]
+
+    def test_remote_writes_seen_after_ttl(self):
+        schemas = self.lookup()
+        generation = schema_generation(self.party_t.pk)
+
+        # Simulate a schema change made by another process.
+        caches['jsonattrs'].incr(generation_cache_key(self.party_t.pk))
+        assert schema_generation(self.party_t.pk) == generation
+        assert self.lookup() is schemas
+
+        with override_settings(JSONATTRS_LOCAL_CACHE_TTL=0):
+            assert schema_generation(self.party_t.pk) == generation + 1
+            assert self.lookup() is not schemas
+
+
+class AttributeInvalidationTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        self.party_t = self.fixtures['party_t']
+
+    def test_save_with_loaded_schema(self):
+        attr = Attribute.objects.select_related('schema').get(
+            schema=self.schemata['party-default'], name='gender'
+        )
+        generation = schema_generation(self.party_t.pk)
+        with self.assertNumQueries(1):
+            attr.save()
+        assert schema_generation(self.party_t.pk) > generation
+
+    def test_save_and_delete_without_schema(self):
+        attr = Attribute.objects.get(
+            schema=self.schemata['party-default'], name='gender'
+        )
+        generation = schema_generation(self.party_t.pk)
+        attr.save()
+        assert schema_generation(self.party_t.pk) > generation
+        assert not Attribute.schema.is_cached(attr)
+        generation = schema_generation(self.party_t.pk)
+        attr.delete()
+        assert schema_generation(self.party_t.pk) > generation
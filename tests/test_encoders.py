@@ -0,0 +1,119 @@
+import json
+import pytest
+from datetime import date, datetime, time, timezone
+from decimal import Decimal
+from unittest.mock import patch
+from uuid import UUID
+
+from django.test import override_settings
+
+from jsonattrs import encoders
+from jsonattrs.encoders import get_encoder, json_dumps, json_serialiser
+
+
+BACKENDS = ['json', pytest.param('orjson', marks=pytest.mark.skipif(
+    encoders.orjson is None, reason='orjson is not installed'
+))]
+
+PAYLOADS = [
+    {},
+    {'name': 'Bilbo Baggins', 'age': 111, 'height': 1.07, 'hobbit': True,
+     'ring': None},
+    {'dob': date(1890, 9, 22),
+     'updated': datetime(2017, 1, 12, 13, 6, 11),
+     'precise': datetime(2017, 1, 12, 13, 6, 11, 123456),
+     'aware': datetime(2017, 1, 12, 13, 6, 11, tzinfo=timezone.utc)},
+    {'area': Decimal('12.50'), 'tiny': Decimal('1e-7'), 'big': 10**20},
+    {'infrastructure': ['water', 'food'], 'nested': {'a': [1, {'b': 2}]},
+     'unicode': 'Ünïcödé – ✓', 'quote': 'say "hi"\n'},
+    {1: 'int key'},
+]
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('payload', PAYLOADS)
+def test_round_trip(backend, payload):
+    encoded = encoders.BACKENDS[backend](payload)
+    assert isinstance(encoded, str)
+    assert json.loads(encoded) == json.loads(json_dumps(payload))
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_unconvertible(backend):
+    with pytest.raises(TypeError):
+        encoders.BACKENDS[backend]({'x': object()})
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_unconvertible_time(backend):
+    with pytest.raises(TypeError):
+        encoders.BACKENDS[backend]({'opens': time(9, 30)})
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+@pytest.mark.parametrize('value', [
+    {'nan': float('nan')}, {'inf': [1.5, float('-inf')]},
+    {'decimal': Decimal('NaN')}, {'nested': {'x': float('inf')}},
+])
+def test_non_finite(backend, value):
+    with pytest.raises(ValueError):
+        encoders.BACKENDS[backend](value)
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_same_output(backend):
+    value = {'id': UUID('6ccbbf7e-2555-442f-9fbe-52bc48e2e6a6'),
+             'when': datetime(2017, 1, 12, 13, 6, 11, 500,
+                              tzinfo=timezone.utc),
+             'naive': datetime(2017, 1, 12, 13, 6, 11)}
+    assert (json.loads(encoders.BACKENDS[backend](value)) ==
+            {'id': '6ccbbf7e-2555-442f-9fbe-52bc48e2e6a6',
+             'when': '2017-01-12T13:06:11.000500+00:00',
+             'naive': '2017-01-12T13:06:11'})
+
+
+def test_default_backend():
+    with override_settings(JSONATTRS_JSON_ENCODER=None):
+        expected = 'json' if encoders.orjson is None else 'orjson'
+        assert get_encoder() is encoders.BACKENDS[expected]
+
+
+def test_select_backend():
+    with override_settings(JSONATTRS_JSON_ENCODER='json'):
+        assert get_encoder() is json_dumps
+        assert json_serialiser({'a': 1}) == '{"a": 1}'
+    with override_settings(JSONATTRS_JSON_ENCODER='json.dumps'):
+        assert get_encoder() is json.dumps
+
+
+def test_missing_backend():
+    with patch.object(encoders, 'orjson', None):
+        with override_settings(JSONATTRS_JSON_ENCODER='orjson'):
+            with pytest.raises(ImportError):
+                get_encoder()
+
+
+@pytest.mark.parametrize('backend', BACKENDS)
+def test_exact_decimals(backend):
+    dumps = encoders.exact_decimal_dumps(encoders.BACKENDS[backend])
+    value = {'area': Decimal('1234567890.123456789012'),
+             'list': [Decimal('1.10'), Decimal('-2E+3')],
+             'text': 'D12.5', 'int': 3}
+    encoded = dumps(value)
+    assert '1234567890.123456789012' in encoded
+    assert '1.10' in encoded and '-2E+3' in encoded
+    decoded = json.loads(encoded, parse_float=Decimal)
+    assert decoded['area'] == Decimal('1234567890.123456789012')
+    assert decoded['list'] == [Decimal('1.10'), Decimal('-2E+3')]
+    assert decoded['text'] == 'D12.5'
+    assert decoded['int'] == 3
+    with pytest.raises(ValueError):
+        dumps({'nan': Decimal('NaN')})
+
+
+def test_exact_decimals_setting():
+    value = {'area': Decimal('0.1')}
+    with override_settings(JSONATTRS_EXACT_DECIMALS=True):
+        assert json.loads(json_serialiser(value),
+                          parse_float=Decimal) == value
+    assert json_serialiser(value) in ('{"area": 0.1}', '{"area":0.1}')
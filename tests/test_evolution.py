@@ -0,0 +1,197 @@
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase
+
+from jsonattrs.evolution import (
+    analyse_conflicts, drop_attribute, fill_default, rename_attribute,
+    retype_attribute, schema_queryset
+)
+from jsonattrs.models import Attribute, AttributeType, Schema
+
+from .fixtures import create_fixtures, create_labelled_schemata
+from .models import Labelled, Party
+
+
+def raw_attrs(name):
+    return Labelled.objects.values_list('attrs', flat=True).get(name=name)
+
+
+class SchemaEvolutionTest(TestCase):
+    def setUp(self):
+        create_labelled_schemata()
+        self.schema = Schema.objects.get(
+            content_type=ContentType.objects.get_for_model(Labelled),
+            selectors=['initial']
+        )
+        for name, attrs in (('a', {'f2': 'x', 'f3': '5'}),
+                            ('b', {'f2': 'y'}),
+                            ('c', {'f2': 'z', 'f1': 'old', 'f3': ''}),
+                            ('d', {'f2': 'w'})):
+            Labelled.objects.create(name=name, label='initial', attrs=attrs)
+        # A value that the integer type would reject.
+        Labelled.objects.filter(name='b').update(
+            attrs={'f2': 'y', 'f3': 'many'}
+        )
+        Labelled.objects.create(name='other', label='remove_non_required',
+                                attrs={'f2': 'v', 'f3': '1'})
+
+    def test_rename(self):
+        assert rename_attribute(self.schema, 'f2', 'f1',
+                                dry_run=True) == (3, 1)
+        assert raw_attrs('a') == {'f2': 'x', 'f3': '5'}
+        assert rename_attribute(self.schema, 'f2', 'f1',
+                                chunk_size=2) == (3, 1)
+        assert raw_attrs('a') == {'f1': 'x', 'f3': '5'}
+        assert raw_attrs('c') == {'f2': 'z', 'f1': 'old', 'f3': ''}
+        assert raw_attrs('other') == {'f2': 'v', 'f3': '1'}
+
+    def test_retype(self):
+        assert retype_attribute(self.schema, 'f3', 'integer',
+                                dry_run=True) == (1, 1)
+        assert retype_attribute(self.schema, 'f3', 'integer') == (1, 1)
+        assert raw_attrs('a')['f3'] == 5
+        assert raw_attrs('b')['f3'] == 'many'
+        assert raw_attrs('c')['f3'] == ''
+        assert retype_attribute(self.schema, 'f3', 'text') == (2, 0)
+        assert raw_attrs('a')['f3'] == '5'
+
+    def test_retype_checked(self):
+        Labelled.objects.filter(name='a').update(
+            attrs={'f2': 'x', 'f3': '99999999999999999999'}
+        )
+        assert retype_attribute(self.schema, 'f3', 'integer') == (0, 2)
+        assert raw_attrs('a')['f3'] == '99999999999999999999'
+
+        Labelled.objects.filter(name='a').update(
+            attrs={'f2': 'x', 'f4': '2017-01-12'}
+        )
+        Labelled.objects.filter(name='b').update(
+            attrs={'f2': 'y', 'f4': '2017-02-30'}
+        )
+        assert retype_attribute(self.schema, 'f4', 'date') == (1, 1)
+        assert raw_attrs('a')['f4'] == '2017-01-12'
+
+    def test_retype_choices(self):
+        Labelled.objects.filter(name='a').update(
+            attrs={'f2': 'x', 'f4': 'abc'}
+        )
+        Labelled.objects.filter(name='b').update(
+            attrs={'f2': 'y', 'f4': ['abc', 'def']}
+        )
+        Labelled.objects.filter(name='c').update(
+            attrs={'f2': 'z', 'f4': 'xyz'}
+        )
+        choices = ['abc', 'def']
+        assert retype_attribute(self.schema, 'f4', 'select_one',
+                                choices=choices, dry_run=True) == (1, 2)
+        assert retype_attribute(self.schema, 'f4', 'select_multiple',
+                                choices=choices) == (2, 1)
+        assert raw_attrs('a')['f4'] == ['abc']
+        assert raw_attrs('b')['f4'] == ['abc', 'def']
+        assert raw_attrs('c')['f4'] == 'xyz'
+
+    def test_no_rows(self):
+        schema = Schema.objects.create(
+            content_type=self.schema.content_type, selectors=['a', 'b']
+        )
+        assert rename_attribute(schema, 'f2', 'f1') == (0, 0)
+        required = Attribute(name='f9', required=True,
+                             attr_type=AttributeType.objects.get(name='text'))
+        assert analyse_conflicts(schema, [required]) == []
+
+    def test_drop(self):
+        assert drop_attribute(self.schema, 'f3') == (3, 0)
+        assert raw_attrs('a') == {'f2': 'x'}
+        assert raw_attrs('other') == {'f2': 'v', 'f3': '1'}
+
+    def test_fill_default(self):
+        assert fill_default(self.schema, 'f3', '0', dry_run=True) == (2, 0)
+        assert fill_default(self.schema, 'f3', '0') == (2, 0)
+        assert raw_attrs('c')['f3'] == '0'
+        assert raw_attrs('d')['f3'] == '0'
+        assert raw_attrs('a')['f3'] == '5'
+
+
+class SchemaQuerysetTest(TestCase):
+    def test_selector_prefix(self):
+        fixtures, schemata = create_fixtures()
+        project = fixtures['proj11']
+        assert (set(schema_queryset(schemata['party-org1'])) ==
+                set(Party.objects.filter(
+                    project__organization=project.organization)))
+        assert (set(schema_queryset(schemata['party-proj11'])) ==
+                set(Party.objects.filter(project=project)))
+        assert schema_queryset(schemata['party-default']).count() == (
+            Party.objects.count()
+        )
+
+
+class ConflictAnalysisTest(TestCase):
+    def setUp(self):
+        create_labelled_schemata()
+        self.schema = Schema.objects.get(
+            content_type=ContentType.objects.get_for_model(Labelled),
+            selectors=['initial']
+        )
+        self.objs = [
+            Labelled.objects.create(name=name, label='initial', attrs=attrs)
+            for name, attrs in (('a', {'f2': 'x', 'f3': 5, 'f4': 'abc'}),
+                                ('b', {'f2': 'y', 'f4': 'def'}),
+                                ('c', {'f2': 'z', 'f3': '', 'f4': 'ghi'}))
+        ]
+        self.attrs = {a.name: a for a in
+                      self.schema.attributes.select_related('attr_type')}
+
+    def test_no_conflicts(self):
+        with self.assertNumQueries(1):
+            assert analyse_conflicts(self.schema,
+                                     self.attrs.values()) == []
+
+    def test_conflicts(self):
+        text_type = AttributeType.objects.get(name='text')
+        self.attrs['f3'].attr_type = AttributeType.objects.get(name='date')
+        self.attrs['f4'].choices = ['abc', 'xyz']
+        self.attrs['f5'] = Attribute(name='f5', attr_type=text_type,
+                                     required=True, default='')
+        self.attrs['f6'] = Attribute(name='f6', attr_type=text_type,
+                                     required=True, default='x')
+        with self.assertNumQueries(2):
+            report = analyse_conflicts(self.schema, self.attrs.values(),
+                                       samples=1)
+        report = {(c.conflict.field, c.conflict.typ): (c.count, c.samples)
+                  for c in report}
+        a, b, c = [o.pk for o in self.objs]
+        assert report == {
+            ('f3', 'incompatible_type'): (1, [a]),
+            ('f4', 'incompatible_choices'): (2, [b]),
+            ('f5', 'required_no_default'): (3, [a]),
+        }
+        report = analyse_conflicts(self.schema, self.attrs.values(),
+                                   strict=False)
+        assert len(report) == 2
+
+
+class ParentSchemaConflictTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        self.party = self.fixtures['party111']
+        Party.objects.filter(pk=self.party.pk).update(
+            attrs={'dob': '1975-11-06', 'education': 'primary',
+                   'homeowner': False}
+        )
+        self.schema = self.schemata['party-proj11']
+        self.attrs = list(self.schema.attributes.select_related('attr_type'))
+
+    def test_parent_attribute_changed(self):
+        education = Attribute(
+            name='education', attr_type=AttributeType.objects.get(
+                name='integer'
+            )
+        )
+        report = analyse_conflicts(self.schema, self.attrs + [education])
+        assert [(c.conflict.field, c.conflict.typ, c.samples)
+                for c in report] == [
+            ('education', 'incompatible_type', [self.party.pk])
+        ]
+
+    def test_parent_attribute_unchanged(self):
+        assert analyse_conflicts(self.schema, self.attrs) == []
@@ -0,0 +1,79 @@
+from io import StringIO
+import csv
+import json
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.test import TestCase
+
+from jsonattrs.export import export_csv, export_ndjson
+from jsonattrs.models import Attribute, AttributeType, Schema
+
+from .fixtures import create_labelled_schemata
+from .models import Labelled
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        create_labelled_schemata()
+        schema = Schema.objects.create(
+            content_type=ContentType.objects.get_for_model(Labelled),
+            selectors=('xlat',), default_language='en'
+        )
+        Attribute.objects.create(
+            schema=schema, name='colour', long_name='Colour', index=1,
+            attr_type=AttributeType.objects.get(name='select_one'),
+            choices=['r', 'g'],
+            choice_labels=[{'en': 'Red', 'fr': 'Rouge'},
+                           {'en': 'Green', 'fr': 'Vert'}]
+        )
+        Attribute.objects.create(
+            schema=schema, name='shades', long_name='Shades', index=2,
+            attr_type=AttributeType.objects.get(name='select_multiple'),
+            choices=['l', 'd'], choice_labels=['Light', 'Dark']
+        )
+        Labelled.objects.create(name='a', label='initial',
+                                attrs={'f2': 'x', 'f3': 5, 'f4': 'abc'})
+        Labelled.objects.create(name='b', label='xlat',
+                                attrs={'colour': 'g', 'shades': ['d', 'l']})
+
+    def test_csv(self):
+        out = StringIO()
+        assert export_csv(Labelled.objects.order_by('name'), out,
+                          chunk_size=1, language='fr') == 2
+        rows = list(csv.reader(StringIO(out.getvalue())))
+        header = rows[0]
+        assert header[:3] == ['id', 'label', 'name']
+        assert sorted(header[3:]) == ['colour', 'f1', 'f2', 'f3', 'f4', 'f5',
+                                      'shades']
+        records = [dict(zip(header, r)) for r in rows[1:]]
+        assert records[0]['f3'] == '5' and records[0]['colour'] == ''
+        assert records[1]['colour'] == 'Vert'
+        assert json.loads(records[1]['shades']) == ['Dark', 'Light']
+
+    def test_ndjson(self):
+        out = StringIO()
+        export_ndjson(Labelled.objects.order_by('name'), out,
+                      fields=['name'], language='de')
+        records = [json.loads(line) for line in out.getvalue().splitlines()]
+        assert records == [
+            {'name': 'a', 'f2': 'x', 'f3': 5, 'f4': 'abc'},
+            {'name': 'b', 'colour': 'Green', 'shades': ['Dark', 'Light']},
+        ]
+
+    def test_stored_values_only(self):
+        Labelled.objects.create(name='c', label='new_required_default',
+                                attrs={'f2': 'y'})
+        Labelled.objects.filter(name='c').update(attrs={'f2': 'y'})
+        out = StringIO()
+        export_ndjson(Labelled.objects.filter(name='c'), out,
+                      fields=['name'])
+        assert json.loads(out.getvalue()) == {'name': 'c', 'f2': 'y'}
+
+    def test_command(self):
+        out = StringIO()
+        call_command('exportattrs', 'tests.labelled', '--format', 'ndjson',
+                     '--language', 'en', stdout=out)
+        lines = out.getvalue().splitlines()
+        assert len(lines) == 2
+        assert {json.loads(line)['name'] for line in lines} == {'a', 'b'}
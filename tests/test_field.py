@@ -1,13 +1,16 @@
 import pytest
 from decimal import Decimal
 from datetime import date, datetime
-from django.test import TestCase
-from django.core.exceptions import ValidationError
+from django.db import connection, models
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext, isolate_apps
+from django.core.exceptions import FieldError, ValidationError
 
 from .factories import OrganizationFactory
 from .fixtures import create_fixtures
 from .models import Organization, Project, Party, Parcel
-from jsonattrs.fields import convert
+from jsonattrs.fields import JSONAttributes, JSONAttributeField, convert
+from jsonattrs.models import Attribute, AttributeType
 
 
 def test_convert_decimal():
@@ -57,6 +60,12 @@ class FieldSchemaTest(FieldTestBase):
         assert 'dob' in party.attrs
         assert 'homeowner' in party.attrs
 
+    def test_no_schema_for_null_selectors(self):
+        party = Party(name='Nobody')
+        assert party.attrs.schemas == []
+        with pytest.raises(KeyError):
+            party.attrs['gender'] = 'female'
+
     def test_schema_composition_with_omit(self):
         tstparty = Party.objects.create(
             project=self.fixtures['proj12'],
@@ -219,3 +228,208 @@ class FieldDbTest(FieldTestBase):
         prj.save()
         prj_check = Project.objects.get(name='Project #1.1')
         assert prj_check.attrs['head'] == 'Jim Jimson'
+
+
+class FieldDescriptorTest(FieldTestBase):
+    def test_lazy_wrapping(self):
+        prj = Project.objects.get(name='Project #1.1')
+        assert type(prj.__dict__['attrs']) is dict
+        attrs = prj.attrs
+        assert isinstance(attrs, JSONAttributes)
+        assert attrs._instance is prj
+        assert prj.attrs is attrs
+        assert prj._attr_field is attrs
+
+    def test_deferred_field(self):
+        prj = Project.objects.only('name').get(name='Project #1.1')
+        assert 'attrs' not in prj.__dict__
+        with self.assertNumQueries(1):
+            attrs = prj.attrs
+        assert isinstance(attrs, JSONAttributes)
+        assert attrs._instance is prj
+
+    def test_assignment(self):
+        prj = Project.objects.get(name='Project #1.1')
+        prj.attrs = {'head': 'Jim Jimson'}
+        assert isinstance(prj.attrs, JSONAttributes)
+        assert prj.attrs._instance is prj
+        prj.save()
+        assert Project.objects.get(pk=prj.pk).attrs['head'] == 'Jim Jimson'
+
+    def test_new_instance(self):
+        org = Organization(name='New organization')
+        assert isinstance(org.attrs, JSONAttributes)
+        assert org.attrs._instance is org
+
+    @isolate_apps('tests')
+    def test_multiple_fields(self):
+        with pytest.raises(FieldError):
+            class Twice(models.Model):
+                attrs = JSONAttributeField()
+                more_attrs = JSONAttributeField()
+
+
+class FieldSaveChangesTest(FieldTestBase):
+    def setUp(self):
+        super().setUp()
+        self.party = Party.objects.filter(
+            project=self.fixtures['proj11']
+        ).first()
+        self.party.attrs['gender'] = 'female'
+        self.party.save()
+
+    def reload(self):
+        return Party.objects.get(pk=self.party.pk)
+
+    def test_no_changes(self):
+        party = self.reload()
+        party.attrs['gender'] = 'female'
+        assert not party.attrs.has_changes
+        with self.assertNumQueries(0):
+            party.attrs.save_changes()
+
+    def test_set_key(self):
+        party = self.reload()
+        party.attrs['education'] = 'MSc'
+        assert party.attrs.has_changes
+        with self.assertNumQueries(1):
+            party.attrs.save_changes()
+        assert not party.attrs.has_changes
+        assert self.reload().attrs['education'] == 'MSc'
+        assert self.reload().attrs['gender'] == 'female'
+
+    def test_deferred_load(self):
+        party = Party.objects.only('pk').get(pk=self.party.pk)
+        party.attrs['education'] = 'MSc'
+        assert not party.attrs._replaced
+        with CaptureQueriesContext(connection) as queries:
+            party.attrs.save_changes()
+        assert len(queries) == 1
+        assert '||' in queries[0]['sql']
+        assert self.reload().attrs['education'] == 'MSc'
+
+    def test_refresh_from_db(self):
+        party = self.reload()
+        party.attrs['education'] = 'BSc'
+        party.refresh_from_db(fields=['attrs'])
+        assert 'education' not in party.attrs
+        assert not party.attrs.has_changes
+        party.attrs['education'] = 'MSc'
+        assert not party.attrs._replaced
+        with CaptureQueriesContext(connection) as queries:
+            party.attrs.save_changes()
+        assert '||' in queries[0]['sql']
+        assert self.reload().attrs['gender'] == 'female'
+
+    def test_delete_key(self):
+        party = self.reload()
+        del party.attrs['gender']
+        party.attrs.save_changes()
+        assert 'gender' not in self.reload().attrs
+
+    def test_concurrent_writers(self):
+        party1 = self.reload()
+        party2 = self.reload()
+        party1.attrs['education'] = 'MSc'
+        party2.attrs['gender'] = 'male'
+        party1.attrs.save_changes()
+        party2.attrs.save_changes()
+        attrs = self.reload().attrs
+        assert attrs['education'] == 'MSc'
+        assert attrs['gender'] == 'male'
+
+    def test_replaced(self):
+        party = self.reload()
+        party.attrs = {'dob': '1972-05-10', 'education': 'BA'}
+        assert party.attrs.has_changes
+        party.attrs.save_changes()
+        attrs = self.reload().attrs
+        assert attrs['education'] == 'BA'
+        assert 'gender' not in attrs
+
+    def test_full_save_clears_changes(self):
+        party = self.reload()
+        party.attrs['education'] = 'MSc'
+        party.save()
+        assert not party.attrs.has_changes
+
+    def test_unsaved(self):
+        party = Party(project=self.fixtures['proj11'], name='New party')
+        party.attrs['gender'] = 'female'
+        with pytest.raises(ValueError):
+            party.attrs.save_changes()
+
+
+@override_settings(JSONATTRS_EXACT_DECIMALS=True)
+class FieldExactDecimalTest(FieldTestBase):
+    def setUp(self):
+        super().setUp()
+        Attribute.objects.create(
+            schema=self.schemata['party-default'], name='area',
+            long_name='Area', index=10,
+            attr_type=AttributeType.objects.get(name='decimal')
+        )
+        self.party = Party.objects.first()
+
+    def reload(self):
+        return Party.objects.get(pk=self.party.pk)
+
+    def test_round_trip(self):
+        area = Decimal('1234567890.123456789012')
+        self.party.attrs['area'] = area
+        self.party.save()
+        assert self.reload().attrs['area'] == area
+        assert isinstance(self.reload().attrs['area'], Decimal)
+        values = Party.objects.filter(pk=self.party.pk).values('attrs')
+        assert values[0]['attrs']['area'] == area
+
+    def test_integral_decimal(self):
+        self.party.attrs['area'] = Decimal(12)
+        self.party.save()
+        party = self.reload()
+        assert party.attrs.attributes['area'].attr_type.name == 'decimal'
+        assert party.attrs['area'] == Decimal(12)
+        assert isinstance(party.attrs['area'], Decimal)
+
+    def test_read_without_schema(self):
+        self.party.attrs['area'] = Decimal(12)
+        self.party.save()
+        party = self.reload()
+        assert isinstance(party.attrs['area'], Decimal)
+        assert party.attrs.get('area') == Decimal(12)
+        assert not party.attrs._setup
+        assert type(party.attrs.data['area']) is int
+
+    def test_read_keeps_required_defaults(self):
+        Attribute.objects.create(
+            schema=self.schemata['party-default'], name='rooms',
+            long_name='Rooms', index=11, required=True, default='1',
+            attr_type=AttributeType.objects.get(name='integer')
+        )
+        Party.objects.filter(pk=self.party.pk).update(
+            attrs=dict(self.party.attrs.data, area=12, rooms=3)
+        )
+        party = self.reload()
+        assert party.attrs['area'] == Decimal(12)
+        assert party.attrs['rooms'] == 3
+        assert party.attrs._changed == set()
+        assert not party.attrs.has_changes
+        party.save()
+        stored = Party.objects.values_list('attrs', flat=True).get(
+            pk=self.party.pk
+        )
+        assert stored['rooms'] == 3
+
+    def test_non_decimal_attributes(self):
+        Attribute.objects.create(
+            schema=self.schemata['party-default'], name='ratio',
+            long_name='Ratio', index=11,
+            attr_type=AttributeType.objects.get(name='text')
+        )
+        Party.objects.filter(pk=self.party.pk).update(
+            attrs=dict(self.party.attrs.data, area=1.5, ratio=0.25)
+        )
+        party = self.reload()
+        assert isinstance(party.attrs['area'], Decimal)
+        assert party.attrs['ratio'] == 0.25
+        assert isinstance(party.attrs['ratio'], float)
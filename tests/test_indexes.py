@@ -0,0 +1,102 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from jsonattrs.indexes import attribute_indexes, existing_indexes, sync_indexes
+from jsonattrs.models import Attribute, AttributeType
+
+from .fixtures import create_fixtures, create_labelled_schemata
+from .models import Labelled, Party
+
+
+class AttributeIndexTest(TestCase):
+    def setUp(self):
+        create_labelled_schemata()
+        self.f3 = Attribute.objects.get(schema__selectors=['initial'],
+                                        name='f3')
+        self.f3.index_type = 'btree'
+        self.f3.save()
+
+    def test_definition(self):
+        indexes = list(attribute_indexes().values())
+        assert len(indexes) == 1
+        assert indexes[0].table == Labelled._meta.db_table
+        assert "(\"attrs\" ->> 'f3')" in indexes[0].sql
+        assert 'jsonattrs_int(' in indexes[0].sql
+        assert indexes[0].sql.endswith("WHERE \"label\" = 'initial'")
+
+    def test_sync(self):
+        created, dropped = sync_indexes(concurrently=False)
+        assert len(created) == 1 and dropped == []
+        assert existing_indexes() == {created[0]: True}
+        assert sync_indexes(concurrently=False) == ([], [])
+
+        self.f3.index_type = ''
+        self.f3.save()
+        assert sync_indexes(concurrently=False) == ([], created)
+        assert existing_indexes() == {}
+
+    def test_index_used(self):
+        sync_indexes(concurrently=False)
+        qs = Labelled.objects.filter(label='initial', attrs__int__f3__gt=10)
+        sql, params = qs.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET LOCAL enable_seqscan = off')
+            cursor.execute('EXPLAIN ' + sql, params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+        assert 'jsonattrs_idx_' in plan
+
+    def test_changed_definition(self):
+        created, _ = sync_indexes(concurrently=False)
+        self.f3.index_type = 'gin'
+        self.f3.save()
+        new, dropped = sync_indexes(concurrently=False)
+        assert dropped == created and len(new) == 1 and new != created
+        assert 'USING gin' in attribute_indexes()[new[0]].sql
+
+    def test_dry_run(self):
+        created, _ = sync_indexes(dry_run=True)
+        assert len(created) == 1
+        assert existing_indexes() == {}
+
+    def test_command(self):
+        out = StringIO()
+        call_command('syncattrindexes', '--no-concurrently', stdout=out)
+        assert out.getvalue().startswith('Created index jsonattrs_idx_')
+        out = StringIO()
+        call_command('syncattrindexes', '--dry-run', stdout=out)
+        assert out.getvalue() == ''
+
+
+class UnscopedIndexTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        # The organization selector is not stored in the party table, so
+        # the index covers every party.
+        Attribute.objects.create(
+            schema=self.schemata['party-org1'], name='rooms',
+            long_name='Rooms', index=10, index_type='btree',
+            attr_type=AttributeType.objects.get(name='integer')
+        )
+        self.other = self.fixtures['party211']
+
+    def test_definition(self):
+        indexes = list(attribute_indexes().values())
+        assert len(indexes) == 1
+        assert 'WHERE' not in indexes[0].sql
+
+    def test_values_of_other_schemata(self):
+        Party.objects.filter(pk=self.other.pk).update(
+            attrs={'rooms': 'many'}
+        )
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        created, _ = sync_indexes(concurrently=False)
+        assert len(created) == 1
+        Party.objects.filter(pk=self.other.pk).update(
+            attrs={'rooms': '2017-01-01'}
+        )
+        assert Party.objects.filter(attrs__int__rooms__isnull=False,
+                                    pk=self.other.pk).count() == 0
@@ -0,0 +1,104 @@
+from io import StringIO
+import json
+import os
+import tempfile
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from jsonattrs.loader import load_records, read_csv, read_ndjson
+
+from .fixtures import create_labelled_schemata
+from .models import Labelled
+
+
+CSV = '''label,name,f1,f2,f3,f4,f5
+initial,a,one,x,5,abc,
+initial,b,,y,,,
+initial,c,,,7,,
+remove_non_required,d,two,z,,,
+initial,e,,"tab\tand\nnewline",,mno,
+new_non_required,f,,w,,,extra
+'''
+
+
+class LoaderTest(TestCase):
+    def setUp(self):
+        create_labelled_schemata()
+        self.rejected = []
+
+    def reject(self, record, errors):
+        self.rejected.append((record, errors))
+
+    def test_csv(self):
+        result = load_records(Labelled, read_csv(StringIO(CSV)),
+                              chunk_size=4, reject=self.reject)
+        assert result == (3, 3)
+        loaded = {o.name: o for o in Labelled.objects.all()}
+        assert sorted(loaded) == ['a', 'b', 'f']
+        assert dict(loaded['a'].attrs) == {
+            'f1': 'one', 'f2': 'x', 'f3': '5', 'f4': 'abc'
+        }
+        assert loaded['f'].attrs['f5'] == 'extra'
+
+        assert dict(loaded['b'].attrs) == {'f2': 'y'}
+        errors = {r['name']: e for r, e in self.rejected}
+        assert errors['c'] == ['Missing required field f2']
+        assert errors['d'] == ['Unknown key "f1"']
+        assert errors['e'] == ['Invalid choice for f4: "mno"']
+
+    def test_read_csv_empty_cells(self):
+        records = list(read_csv(StringIO('label,name,f2\ninitial,,x\n')))
+        assert records == [{'label': 'initial', 'name': '', 'f2': 'x'}]
+        assert load_records(Labelled, records) == (1, 0)
+        assert Labelled.objects.get().name == ''
+
+    def test_special_characters(self):
+        records = [{'label': 'initial', 'name': 'a\\b',
+                    'attrs': {'f2': 'tab\tand\nnewline \\N'}}]
+        assert load_records(Labelled, records) == (1, 0)
+        obj = Labelled.objects.get()
+        assert obj.name == 'a\\b'
+        assert obj.attrs['f2'] == 'tab\tand\nnewline \\N'
+
+    def test_ndjson(self):
+        lines = [
+            json.dumps({'label': 'initial', 'name': 'a',
+                        'attrs': {'f2': 'x', 'f3': 12}}),
+            '',
+            'not json',
+            json.dumps({'label': 'unknown', 'name': 'b', 'f2': 'x'}),
+        ]
+        result = load_records(Labelled,
+                              read_ndjson(StringIO('\n'.join(lines))),
+                              reject=self.reject)
+        assert result == (1, 2)
+        assert Labelled.objects.get().attrs['f3'] == 12
+        assert self.rejected[0] == ('not json', ['Invalid record'])
+        assert self.rejected[1][1][0].startswith('Unknown key')
+
+    def test_null_selector(self):
+        records = [{'label': None, 'name': 'a', 'f2': 'x'}]
+        assert load_records(Labelled, records, reject=self.reject) == (0, 1)
+        assert self.rejected == [
+            (records[0], ['No schema for selectors [None]'])
+        ]
+
+    def test_default_filled(self):
+        records = [{'label': 'new_required_default', 'name': 'a', 'f2': 'x'}]
+        assert load_records(Labelled, records) == (1, 0)
+        assert Labelled.objects.get().attrs['f5'] == 'default'
+
+    def test_command(self):
+        tmp = tempfile.mkdtemp()
+        path = os.path.join(tmp, 'data.csv')
+        reject_path = os.path.join(tmp, 'rejects.ndjson')
+        with open(path, 'w') as f:
+            f.write(CSV)
+        out = StringIO()
+        call_command('loadattrs', 'tests.labelled', path,
+                     '--reject', reject_path, stdout=out)
+        assert out.getvalue().strip() == 'Loaded 3 records, rejected 3'
+        with open(reject_path) as f:
+            rejects = [json.loads(line) for line in f]
+        assert [r['record']['name'] for r in rejects] == ['c', 'd', 'e']
@@ -0,0 +1,195 @@
+from django.contrib.contenttypes.models import ContentType
+from django.test import TestCase, override_settings
+import pytest
+
+from jsonattrs.cache import cache_clear
+from jsonattrs.exceptions import BulkValidationException
+from jsonattrs.models import Attribute, AttributeType, Schema
+
+from .fixtures import create_fixtures
+from .models import Party, Parcel
+
+
+class PrefetchSchemasTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        cache_clear()
+
+    def check_parties(self, parties):
+        assert len(parties) == 45
+        for party in parties:
+            assert 'gender' in party.attrs.attributes
+            assert (party.attrs.schemas[0] ==
+                    self.schemata['party-default'])
+
+    def test_selector_related_paths(self):
+        assert Schema.objects.selector_related_paths(
+            self.fixtures['party_t']
+        ) == ['project']
+        assert Schema.objects.selector_related_paths(
+            self.fixtures['project_t']
+        ) == []
+
+    def test_prefetch_schemas(self):
+        # One query for the rows with their projects, one for the
+        # schemata and one for their attributes.
+        with self.assertNumQueries(3):
+            parties = list(Party.objects.prefetch_schemas())
+            self.check_parties(parties)
+
+    def test_prefetch_schemas_chained(self):
+        with self.assertNumQueries(3):
+            parties = list(Party.objects.prefetch_schemas()
+                           .filter(name__startswith='Party').order_by('pk'))
+            self.check_parties(parties)
+
+    def test_prefetch_schemas_iterator(self):
+        with self.assertNumQueries(3):
+            parties = list(Party.objects.prefetch_schemas().iterator())
+            self.check_parties(parties)
+
+    def test_prefetch_schemas_iterator_chunks(self):
+        # Schemata are resolved in bulk for each chunk of rows: one query
+        # for the rows plus two for each of the five chunks.
+        with self.assertNumQueries(11):
+            parties = list(
+                Party.objects.prefetch_schemas().iterator(chunk_size=10)
+            )
+            self.check_parties(parties)
+
+    def test_prefetch_schemas_values(self):
+        rows = list(Parcel.objects.prefetch_schemas().values('address'))
+        assert len(rows) == 45
+
+    def test_without_prefetch_schemas(self):
+        parties = list(Party.objects.all())
+        assert all(p.attrs._attached is None for p in parties)
+
+
+class BulkOperationsTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        cache_clear()
+
+    def test_bulk_create(self):
+        projects = [self.fixtures['proj11'], self.fixtures['proj21']]
+        parties = [Party(name='Bulk {}'.format(i), project=projects[i % 2],
+                         attrs={'dob': '1990-01-0{}'.format(i + 1)})
+                   for i in range(6)]
+        # Schemata and their attributes are looked up once for the two
+        # selector tuples, then all parties are inserted together.
+        with self.assertNumQueries(3):
+            Party.objects.bulk_create(parties)
+        created = Party.objects.filter(name__startswith='Bulk ')
+        assert created.count() == 6
+        homeowner = {p.name: p.attrs.get('homeowner') for p in created}
+        assert homeowner['Bulk 0'] == 'False'
+        assert homeowner['Bulk 1'] is None
+
+    def test_bulk_create_errors(self):
+        project = self.fixtures['proj11']
+        parties = [
+            Party(name='Good', project=project, attrs={'dob': '1990-01-01'}),
+            Party(name='Missing', project=project, attrs={'gender': 'f'}),
+            Party(name='Unknown', project=project,
+                  attrs={'dob': '1990-01-01', 'shoe_size': 9}),
+        ]
+        with pytest.raises(BulkValidationException) as e:
+            Party.objects.bulk_create(parties)
+        assert sorted(e.value.errors) == [1, 2]
+        assert e.value.errors[1] == ['Missing required field dob']
+        assert not Party.objects.filter(name='Good').exists()
+
+    def test_bulk_update(self):
+        parties = list(Party.objects.filter(
+            project=self.fixtures['proj11']
+        ).order_by('pk'))
+        for i, party in enumerate(parties):
+            party.name = 'Updated {}'.format(i)
+            party.attrs['gender'] = 'g{}'.format(i)
+        with self.assertNumQueries(3):
+            assert Party.objects.bulk_update(
+                parties, ['name', 'attrs'], batch_size=2
+            ) == len(parties)
+        for i, party in enumerate(Party.objects.filter(
+                project=self.fixtures['proj11']).order_by('pk')):
+            assert party.name == 'Updated {}'.format(i)
+            assert party.attrs['gender'] == 'g{}'.format(i)
+            assert party.attrs['homeowner'] == 'False'
+
+    def test_bulk_update_errors(self):
+        party = Party.objects.get(pk=self.fixtures['party111'].pk)
+        party.attrs = {'gender': 'x'}
+        with pytest.raises(BulkValidationException) as e:
+            Party.objects.bulk_update([party], ['attrs'])
+        assert e.value.errors == {0: ['Missing required field dob']}
+        with pytest.raises(ValueError):
+            Party.objects.bulk_update([Party(name='New')], ['name'])
+
+
+class FacetCountsTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        project = self.fixtures['proj11']
+        values = [('point', ['water', 'food']), ('point', ['food']),
+                  ('text', []), ('', ['water'])]
+        parcels = Parcel.objects.filter(project=project).order_by('pk')
+        for parcel, (quality, infrastructure) in zip(parcels, values):
+            Parcel.objects.filter(pk=parcel.pk).update(attrs={
+                'quality': quality, 'infrastructure': infrastructure
+            })
+        self.project = project
+
+    def test_facet_counts(self):
+        qs = Parcel.objects.filter(project=self.project)
+        with self.assertNumQueries(2):
+            facets = qs.facet_counts('quality', 'infrastructure')
+        quality = {f.value: (f.label, f.count) for f in facets['quality']}
+        assert quality['point'] == ('Point geometry', 2)
+        assert quality['text'] == ('Textual', 1)
+        assert quality['polygon_high'][1] == 0
+        assert quality['none'] == ('None', 1)
+        assert [f.value for f in facets['quality']][:2] == ['none', 'text']
+        assert [(f.value, f.count) for f in facets['infrastructure']] == [
+            ('water', 2), ('transportation', 0), ('food', 2),
+            ('sanitation', 0)
+        ]
+
+    @override_settings(JSONATTRS_EXACT_DECIMALS=True)
+    def test_exact_decimals(self):
+        qs = Parcel.objects.filter(project=self.project)
+        facets = qs.facet_counts('quality')
+        assert ('point', 2) in [(f.value, f.count) for f in facets['quality']]
+
+    def test_scalar_list_value(self):
+        parcel = Parcel.objects.filter(project=self.project).last()
+        Parcel.objects.filter(pk=parcel.pk).update(attrs={
+            'quality': 'none', 'infrastructure': 'sanitation'
+        })
+        qs = Parcel.objects.filter(project=self.project)
+        counts = {f.value: f.count
+                  for f in qs.facet_counts('infrastructure')['infrastructure']}
+        assert counts['sanitation'] == 1
+
+    def test_composed_schemata(self):
+        other = self.fixtures['proj12']
+        schema = Schema.objects.create(
+            content_type=ContentType.objects.get_for_model(Parcel),
+            selectors=(other.organization.pk, other.pk)
+        )
+        Attribute.objects.create(
+            schema=schema, name='quality', long_name='Quality', index=1,
+            attr_type=AttributeType.objects.get(name='select_one'),
+            choices=['good', 'bad'], choice_labels=['Good', 'Bad']
+        )
+        facets = Parcel.objects.filter(
+            project=self.project
+        ).facet_counts('quality')
+        assert 'good' not in [f.value for f in facets['quality']]
+        facets = Parcel.objects.filter(project=other).facet_counts('quality')
+        assert [(f.value, f.label) for f in facets['quality']][:2] == [
+            ('good', 'Good'), ('bad', 'Bad')
+        ]
+        assert Parcel.objects.none().facet_counts('quality') == {
+            'quality': []
+        }
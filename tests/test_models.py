@@ -1,8 +1,17 @@
+import pickle
+import pytest
 from collections import OrderedDict
 from django.test import TestCase
 from unittest.mock import patch, MagicMock
 
-from jsonattrs.models import Schema, Attribute, AttributeType, compose_schemas
+from django.core.cache import caches
+from jsonattrs.models import (
+    Schema, Attribute, AttributeType, compose_schemas, compose_cache_key,
+    composed_schema
+)
+from jsonattrs.cache import (
+    composed_cache, generation_cache_key, schema_generation
+)
 from .fixtures import create_fixtures
 
 
@@ -14,7 +23,7 @@ class ComposeSchemaTest(TestCase):
         )
         self.attr_type = AttributeType.objects.get(name='select_one')
 
-    @patch('jsonattrs.models.caches')
+    @patch('jsonattrs.cache.caches')
     def test_compose_schemas_cache_deserialize(self, mock_caches):
         attr1, attr2 = Attribute.objects.bulk_create(Attribute(
             id=i,
@@ -34,7 +43,10 @@ class ComposeSchemaTest(TestCase):
             {'testattr1'},
             {'testattr2'}
         )
-        mock_cache = MagicMock(get=MagicMock(return_value=cache_value))
+        mock_cache = MagicMock(get_many=MagicMock(side_effect=lambda ks: {
+            k: (7 if k.startswith('jsonattrs:generation:') else cache_value)
+            for k in ks
+        }))
         mock_caches.__getitem__.return_value = mock_cache
 
         assert compose_schemas(self.schema) == (
@@ -46,10 +58,13 @@ class ComposeSchemaTest(TestCase):
             {'testattr2'}
         )
         assert not mock_cache.set.called
+        assert not mock_cache.set_many.called
 
-    @patch('jsonattrs.models.caches')
+    @patch('jsonattrs.cache.caches')
     def test_compose_schemas_cache_serialize(self, mock_caches):
-        mock_cache = MagicMock(get=MagicMock(return_value=None))
+        mock_cache = MagicMock(get_many=MagicMock(side_effect=lambda ks: {
+            k: 7 for k in ks if k.startswith('jsonattrs:generation:')
+        }))
         mock_caches.__getitem__.return_value = mock_cache
 
         attr1, attr2 = Attribute.objects.bulk_create(Attribute(
@@ -73,9 +88,8 @@ class ComposeSchemaTest(TestCase):
             {'testattr1'},
             {'testattr2'}
         )
-        mock_cache.set.assert_called_once_with(
-            'jsonattrs:compose:{}'.format(self.schema.id),
-            (
+        mock_cache.set_many.assert_called_once_with({
+            'jsonattrs:compose:7:{}'.format(self.schema.id): (
                 OrderedDict([
                     ('testattr1', attr1.to_dict()),
                     ('testattr2', attr2.to_dict())
@@ -83,7 +97,7 @@ class ComposeSchemaTest(TestCase):
                 {'testattr1'},
                 {'testattr2'}
             )
-        )
+        })
 
     def test_serialize_deserialize(self):
         attr = Attribute.objects.create(
@@ -101,6 +115,110 @@ class ComposeSchemaTest(TestCase):
         assert repr(attr) == '<Attribute #123: name=testattr>'
 
 
+class SchemaCacheInvalidationTest(TestCase):
+    def setUp(self):
+        self.fixtures = create_fixtures(do_schemas=False, load_attr_types=True)
+        self.attr_type = AttributeType.objects.get(name='text')
+        self.party_schema = Schema.objects.create(
+            content_type=self.fixtures['party_t'], selectors=()
+        )
+        self.parcel_schema = Schema.objects.create(
+            content_type=self.fixtures['parcel_t'], selectors=()
+        )
+        for schema in (self.party_schema, self.parcel_schema):
+            Attribute.objects.create(
+                schema=schema, name='attr', long_name='Attribute',
+                index=1, attr_type=self.attr_type
+            )
+
+    def add_attribute(self, schema):
+        Attribute.objects.create(
+            schema=schema, name='extra', long_name='Extra attribute',
+            index=2, attr_type=self.attr_type
+        )
+
+    def test_invalidation_is_per_content_type(self):
+        party_key = compose_cache_key([self.party_schema])
+        parcel_key = compose_cache_key([self.parcel_schema])
+        compose_schemas(self.party_schema)
+        compose_schemas(self.parcel_schema)
+
+        self.add_attribute(self.party_schema)
+        assert compose_cache_key([self.party_schema]) != party_key
+        assert compose_cache_key([self.parcel_schema]) == parcel_key
+        assert caches['jsonattrs'].get(parcel_key) is not None
+        attrs, _, _ = compose_schemas(self.party_schema)
+        assert list(attrs.keys()) == ['attr', 'extra']
+
+    def composed_names(self):
+        attrs, _, _ = compose_schemas(self.party_schema)
+        return list(attrs.keys())
+
+    def test_attribute_save_invalidation(self):
+        assert self.composed_names() == ['attr']
+        attr = self.party_schema.attributes.get(name='attr')
+        attr.name = 'renamed'
+        attr.save()
+        assert self.composed_names() == ['renamed']
+
+    def test_attribute_delete_invalidation(self):
+        self.add_attribute(self.party_schema)
+        assert self.composed_names() == ['attr', 'extra']
+        self.party_schema.attributes.get(name='extra').delete()
+        assert self.composed_names() == ['attr']
+
+    def test_attribute_queryset_update_invalidation(self):
+        assert self.composed_names() == ['attr']
+        Attribute.objects.filter(schema=self.party_schema).update(omit=True)
+        assert self.composed_names() == []
+
+    def test_attribute_queryset_delete_invalidation(self):
+        self.add_attribute(self.party_schema)
+        assert self.composed_names() == ['attr', 'extra']
+        Attribute.objects.filter(name='extra').delete()
+        assert self.composed_names() == ['attr']
+
+    def test_attribute_bulk_create_invalidation(self):
+        assert self.composed_names() == ['attr']
+        Attribute.objects.bulk_create([Attribute(
+            schema=self.party_schema, name='bulk', long_name='Bulk',
+            index=3, attr_type=self.attr_type
+        )])
+        assert self.composed_names() == ['attr', 'bulk']
+
+    def test_attribute_type_delete_invalidation(self):
+        assert self.composed_names() == ['attr']
+        self.attr_type.delete()
+        assert self.composed_names() == []
+
+    def test_schema_delete_invalidation(self):
+        party_t = self.fixtures['party_t']
+        schema = Schema.objects.create(content_type=party_t, selectors=('1',))
+        assert Schema.objects.lookup(
+            content_type=party_t, selectors=('1',)
+        ) == [self.party_schema, schema]
+        schema.delete()
+        assert Schema.objects.lookup(
+            content_type=party_t, selectors=('1',)
+        ) == [self.party_schema]
+
+    def test_schema_lookup_invalidation(self):
+        party_t = self.fixtures['party_t']
+        assert Schema.objects.lookup(
+            content_type=party_t, selectors=('1',)
+        ) == [self.party_schema]
+        schema = Schema.objects.create(content_type=party_t, selectors=('1',))
+        assert Schema.objects.lookup(
+            content_type=party_t, selectors=('1',)
+        ) == [self.party_schema, schema]
+
+    def test_generation_survives_eviction(self):
+        party_t = self.fixtures['party_t']
+        generation = schema_generation(party_t.pk)
+        caches['jsonattrs'].delete(generation_cache_key(party_t.pk))
+        assert schema_generation(party_t.pk) != generation
+
+
 class AttributeTest(TestCase):
     def setUp(self):
         self.fixtures = create_fixtures(do_schemas=False, load_attr_types=True)
@@ -143,3 +261,65 @@ class AttributeTest(TestCase):
         )
         assert attr.render(None) == ''
         assert attr.render('2018-05-31') == '2018-05-31'
+
+
+class ComposedSchemaTest(TestCase):
+    def setUp(self):
+        self.fixtures = create_fixtures(do_schemas=False, load_attr_types=True)
+        self.schema = Schema.objects.create(
+            content_type=self.fixtures['party_t'], selectors=()
+        )
+        self.attr_type = AttributeType.objects.get(name='select_one')
+        Attribute.objects.create(
+            schema=self.schema, name='tenure', long_name='Tenure', index=1,
+            attr_type=self.attr_type, required=True, default='owned',
+            choices=['owned', 'leased']
+        )
+
+    def test_composed_schema_shared(self):
+        composed = composed_schema(self.schema)
+        assert composed_schema(self.schema) is composed
+        assert composed.required == {'tenure'}
+        assert composed.defaults == {'tenure'}
+        assert dict(composed.required_defaults) == {'tenure': 'owned'}
+        assert dict(composed.choices) == {
+            'tenure': frozenset(['owned', 'leased'])
+        }
+        with pytest.raises(TypeError):
+            composed.attributes['other'] = None
+
+        copy = pickle.loads(pickle.dumps(composed))
+        assert dict(copy.attributes) == dict(composed.attributes)
+        assert copy.required_defaults == composed.required_defaults
+
+    def test_composed_schema_detached(self):
+        composed = composed_schema(self.schema)
+        attr = composed.attributes['tenure']
+        assert attr.schema is not self.schema
+        assert all(a is not attr for a in self.schema.attributes.all())
+        with self.assertNumQueries(0):
+            assert attr.long_name == 'Tenure'
+            assert attr.schema.content_type == self.fixtures['party_t']
+            assert attr.attr_type == self.attr_type
+
+    def test_composed_schema_rebuilt_on_change(self):
+        composed = composed_schema(self.schema)
+        Attribute.objects.create(
+            schema=self.schema, name='other', long_name='Other', index=2,
+            attr_type=self.attr_type
+        )
+        assert composed_schema(self.schema) is not composed
+        assert list(composed_schema(self.schema).attributes) == [
+            'tenure', 'other'
+        ]
+
+    def test_composed_schema_from_shared_cache(self):
+        composed_schema(self.schema)
+        composed_cache.clear()
+
+        # Rebuilding from the shared cache loads attribute types in bulk.
+        with self.assertNumQueries(1):
+            composed = composed_schema(self.schema)
+            attr = composed.attributes['tenure']
+            assert attr.attr_type == self.attr_type
+            assert attr.long_name == 'Tenure'
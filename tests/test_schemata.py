@@ -1,10 +1,15 @@
 import pytest
 from django.test import TestCase
+from django.core.cache import caches
 from django.db.utils import IntegrityError
 
-from jsonattrs.models import Schema
+from jsonattrs.models import (
+    Schema, Attribute, AttributeType, compose_schemas
+)
+from jsonattrs.management.commands import loadattrtypes
 
 from .fixtures import create_fixtures
+from .models import Party
 
 
 class SchemataTest(TestCase):
@@ -110,6 +115,29 @@ class SchemataTest(TestCase):
         check(party, (o2,), s5)
         check(party, (), s6)
 
+    def test_schema_lookup_single_query(self):
+        s1, s2, s3, s4, s5, s6 = self._create_test_schemata()
+        loadattrtypes.run()
+        text_type = AttributeType.objects.get(name='text')
+        for i, s in enumerate((s4, s5, s6)):
+            Attribute.objects.create(schema=s, name='attr{}'.format(i),
+                                     long_name='Attr', attr_type=text_type,
+                                     index=1)
+        party = self.fixtures['party_t']
+        o2 = self.fixtures['org2'].name
+        p21 = self.fixtures['proj21'].name
+        caches['jsonattrs'].clear()
+
+        # One query for the schemata and one for their attributes,
+        # independent of the number of selectors.
+        with self.assertNumQueries(2):
+            schemas = Schema.objects.lookup(content_type=party,
+                                            selectors=(o2, p21, 'extra'))
+        assert schemas == [s6, s5, s4]
+        with self.assertNumQueries(0):
+            attrs, _, _ = compose_schemas(*schemas)
+            assert [a.attr_type.name for a in attrs.values()] == ['text'] * 3
+
     def test_bad_schema_lookup(self):
         s1, s2, s3, s4, s5, s6 = self._create_test_schemata()
         party = self.fixtures['party_t']
@@ -127,3 +155,43 @@ class SchemataTest(TestCase):
         check(party, (o1, None))
         check(party, (None, p21))
         check(party, (None,))
+
+
+class SchemaLookupManyTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        caches['jsonattrs'].clear()
+
+    def test_lookup_many(self):
+        parties = list(Party.objects.select_related('project'))
+        assert len(parties) == 45
+
+        # One query for the schemata of all nine projects and one for
+        # their attributes.
+        with self.assertNumQueries(2):
+            results = Schema.objects.lookup_many(parties)
+        assert len(results) == 45
+
+        # Schemata are attached to each instance's attributes.
+        with self.assertNumQueries(0):
+            for party, schemas in zip(parties, results):
+                assert party.attrs.schemas is schemas
+                assert len(party.attrs.attributes) > 0
+
+        for party, schemas in zip(parties, results):
+            assert Schema.objects.from_instance(party) == schemas
+        party11 = self.fixtures['party111']
+        assert (results[parties.index(party11)] == [
+            self.schemata['party-default'], self.schemata['party-org1'],
+            self.schemata['party-proj11']
+        ])
+
+    def test_lookup_many_cached(self):
+        parties = list(Party.objects.select_related('project'))
+        Schema.objects.lookup_many(parties[:10])
+        parties = list(Party.objects.select_related('project'))
+        with self.assertNumQueries(2):
+            Schema.objects.lookup_many(parties)
+        parties = list(Party.objects.select_related('project'))
+        with self.assertNumQueries(0):
+            Schema.objects.lookup_many(parties)
@@ -1,8 +1,10 @@
 import pytest
+from unittest.mock import patch
 from django.test import TestCase
 from django.core.exceptions import ValidationError
 
 from jsonattrs.exceptions import SchemaUpdateConflict, SchemaUpdateException
+from jsonattrs.fields import JSONAttributes
 
 from .fixtures import create_fixtures, create_labelled_schemata
 from .models import Party, Labelled
@@ -67,6 +69,54 @@ class SelectorUpdateTest(TestCase):
         assert len(tstparty.attrs.attributes) == 3
 
 
+@patch.object(JSONAttributes, '_pre_save_selector_check')
+class SelectorCheckSkipTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+        self.party = Party.objects.filter(
+            project=self.fixtures['proj11']
+        ).first()
+
+    def test_unchanged(self, check):
+        self.party.name = 'Renamed'
+        with self.assertNumQueries(1):
+            self.party.save()
+        assert not check.called
+
+    def test_unchanged_attrs_modified(self, check):
+        self.party.attrs['gender'] = 'female'
+        self.party.save()
+        assert not check.called
+
+    def test_selector_source_changed(self, check):
+        self.party.project = self.fixtures['proj12']
+        self.party.save()
+        assert check.call_count == 1
+        self.party.save()
+        assert check.call_count == 1
+
+    def test_update_fields_without_sources(self, check):
+        self.party.project = self.fixtures['proj12']
+        self.party.name = 'Renamed'
+        self.party.save(update_fields=['name'])
+        assert not check.called
+
+    def test_update_fields_with_sources(self, check):
+        self.party.project = self.fixtures['proj12']
+        self.party.save(update_fields=['project'])
+        assert check.call_count == 1
+
+    def test_attrs_replaced(self, check):
+        self.party.attrs = {'dob': '1972-05-10'}
+        self.party.save()
+        assert check.call_count == 1
+
+    def test_new_instance(self, check):
+        Party.objects.create(project=self.fixtures['proj11'],
+                             name='New party', attrs={'dob': '1972-05-10'})
+        assert check.call_count == 1
+
+
 class LabelledModelTest(TestCase):
     def setUp(self):
         create_labelled_schemata()
@@ -0,0 +1,154 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from django.core.exceptions import ImproperlyConfigured
+from django.test import TestCase, override_settings
+
+from jsonattrs.models import Schema
+from jsonattrs.selectors import (
+    build_selector_config, compile_selector, selector_config
+)
+
+from .fixtures import create_fixtures
+from .models import Organization, Project, Party, Parcel
+
+
+class SelectorAccessorTest(TestCase):
+    def setUp(self):
+        self.fixtures = create_fixtures(do_schemas=False)
+        self.party = Party.objects.first()
+        self.project = self.party.project
+        self.expected = (str(self.project.organization_id),
+                         str(self.project.pk))
+
+    def test_foreign_key_pk_reads_attname(self):
+        project = Project.objects.get(pk=self.project.pk)
+        with self.assertNumQueries(0):
+            assert Schema.objects._get_selectors(project) == (
+                str(project.organization_id),
+            )
+
+    def test_join_lookup(self):
+        party = Party.objects.get(pk=self.party.pk)
+        with self.assertNumQueries(1):
+            assert Schema.objects._get_selectors(party) == self.expected
+
+        # The join lookup is memoised for other instances.
+        other = Party.objects.filter(project=self.project).last()
+        with self.assertNumQueries(0):
+            assert Schema.objects._get_selectors(other) == self.expected
+
+    def test_cached_related_object(self):
+        party = Party.objects.select_related('project').get(pk=self.party.pk)
+        with self.assertNumQueries(0):
+            assert Schema.objects._get_selectors(party) == self.expected
+
+    def test_stale_related_object(self):
+        party = Party.objects.select_related('project').get(pk=self.party.pk)
+        other = Project.objects.exclude(
+            organization_id=self.project.organization_id
+        ).first()
+        party.project_id = other.pk
+        assert Schema.objects._get_selectors(party) == (
+            str(other.organization_id), str(other.pk)
+        )
+
+    def test_plain_field(self):
+        parcel = Parcel.objects.first()
+        expected = (str(parcel.project.organization_id),
+                    str(parcel.project_id), parcel.type)
+        parcel = Parcel.objects.get(pk=parcel.pk)
+        with self.assertNumQueries(1):
+            assert Schema.objects._get_selectors(parcel) == expected
+
+    def test_related_change_clears_memo(self):
+        party = Party.objects.get(pk=self.party.pk)
+        Schema.objects._get_selectors(party)
+        organization = Organization.objects.exclude(
+            pk=self.project.organization_id
+        ).first()
+        self.project.organization = organization
+        self.project.save()
+        assert Schema.objects._get_selectors(party) == (
+            str(organization.pk), str(self.project.pk)
+        )
+
+    def test_compile_selector_value_path(self):
+        accessor = compile_selector(Party, 'project.organization.name')
+        name = self.project.organization.name
+        party = Party.objects.get(pk=self.party.pk)
+        with self.assertNumQueries(1):
+            assert accessor(party) == name
+        with self.assertNumQueries(0):
+            assert accessor(party) == name
+
+    def test_compile_selector_missing_related(self):
+        accessor = compile_selector(Party, 'project.organization.pk')
+        assert accessor(Party(name='Unsaved')) is None
+
+    def test_memo_expires(self):
+        party = Party.objects.get(pk=self.party.pk)
+        Schema.objects._get_selectors(party)
+        organization = Organization.objects.exclude(
+            pk=self.project.organization_id
+        ).first()
+        # Not seen by signals, like a change made by another process.
+        Project.objects.filter(pk=self.project.pk).update(
+            organization=organization
+        )
+        expected = (str(organization.pk), str(self.project.pk))
+        assert Schema.objects._get_selectors(party) == self.expected
+        later = time.monotonic() + 2
+        with patch('jsonattrs.selectors.time.monotonic', return_value=later):
+            assert Schema.objects._get_selectors(party) == expected
+
+    @override_settings(JSONATTRS_SELECTOR_CACHE_TTL=0)
+    def test_memo_disabled(self):
+        party = Party.objects.get(pk=self.party.pk)
+        with self.assertNumQueries(1):
+            assert Schema.objects._get_selectors(party) == self.expected
+        with self.assertNumQueries(1):
+            assert Schema.objects._get_selectors(party) == self.expected
+
+
+class SelectorConfigTest(TestCase):
+    def setUp(self):
+        self.fixtures = create_fixtures(do_schemas=False)
+
+    def test_config(self):
+        config = selector_config()
+        assert config.paths[('tests', 'party')] == (
+            'project.organization.pk', 'project.pk'
+        )
+        assert len(config.accessors[('tests', 'party')]) == 2
+        with pytest.raises(TypeError):
+            config.paths[('tests', 'party')] = ()
+
+    def test_selector_paths_no_queries(self):
+        party_t = self.fixtures['party_t']
+        with self.assertNumQueries(0):
+            assert Schema.objects.selector_paths(party_t) == (
+                'project.organization.pk', 'project.pk'
+            )
+
+    def test_reload_on_setting_change(self):
+        party_t = self.fixtures['party_t']
+        with override_settings(
+                JSONATTRS_SCHEMA_SELECTORS={'tests.party': ('name',)}):
+            assert Schema.objects.selector_paths(party_t) == ('name',)
+            with pytest.raises(KeyError):
+                Schema.objects.selector_paths(self.fixtures['parcel_t'])
+        assert Schema.objects.selector_paths(party_t) == (
+            'project.organization.pk', 'project.pk'
+        )
+
+    def test_unknown_model(self):
+        for key in ('tests.nosuchmodel', 'party'):
+            with pytest.raises(ImproperlyConfigured):
+                build_selector_config({key: ()})
+
+    def test_invalid_paths(self):
+        for paths in ('project.pk', ('project.pk', None), ('',)):
+            with pytest.raises(ImproperlyConfigured):
+                build_selector_config({'tests.party': paths})
@@ -0,0 +1,152 @@
+from datetime import date, datetime
+from decimal import Decimal
+
+from django.db import connection
+from django.test import TestCase
+
+from jsonattrs.transforms import (
+    TYPED_CASTS, attribute_type_cast, typed_key, typed_key_sql
+)
+
+from .fixtures import create_fixtures, create_labelled_schemata
+from .models import Labelled, Party
+
+
+class TypedKeyTransformTest(TestCase):
+    def setUp(self):
+        create_labelled_schemata()
+        for name, f3 in (('a', 5), ('b', 120), ('c', ''), ('d', 1000)):
+            Labelled.objects.create(
+                name=name, label='initial', attrs={'f2': 'x', 'f3': f3}
+            )
+
+    def names(self, qs):
+        return list(qs.values_list('name', flat=True))
+
+    def test_int_range(self):
+        qs = Labelled.objects.filter(attrs__int__f3__gt=100).order_by('name')
+        assert self.names(qs) == ['b', 'd']
+        qs = Labelled.objects.filter(attrs__int__f3__range=(1, 200))
+        assert sorted(self.names(qs)) == ['a', 'b']
+
+    def test_empty_is_null(self):
+        qs = Labelled.objects.filter(attrs__int__f3__isnull=True)
+        assert self.names(qs) == ['c']
+
+    def test_order_by(self):
+        qs = Labelled.objects.filter(attrs__int__f3__isnull=False).order_by(
+            typed_key('attrs', 'f3', 'int').desc()
+        )
+        assert self.names(qs) == ['d', 'b', 'a']
+
+    def test_annotate(self):
+        qs = Labelled.objects.annotate(
+            f3=typed_key('attrs', 'f3', 'dec')
+        ).filter(name='b')
+        assert qs[0].f3 == Decimal(120)
+
+    def test_text(self):
+        qs = Labelled.objects.filter(attrs__text__f2='x')
+        assert len(self.names(qs)) == 4
+
+    def test_plain_key_named_like_a_type(self):
+        Labelled.objects.filter(name='a').update(attrs={'int': 7})
+        qs = Labelled.objects.filter(attrs__int__isnull=False)
+        assert self.names(qs) == ['a']
+        qs = Labelled.objects.filter(attrs__int__startswith='7')
+        assert self.names(qs) == ['a']
+
+    def test_canonical_sql(self):
+        qs = Labelled.objects.filter(attrs__int__f3__gt=100)
+        sql, params = qs.query.sql_with_params()
+        column = '"{}"."attrs"'.format(Labelled._meta.db_table)
+        assert typed_key_sql(column, 'int') in sql
+        assert 'jsonattrs_int((%s ->> %%s))' % column in sql
+
+    def test_invalid_values(self):
+        Labelled.objects.filter(name='a').update(
+            attrs={'f3': 'many', 'f4': '2017-02-30'}
+        )
+        Labelled.objects.filter(name='b').update(
+            attrs={'f3': '99999999999999999999'}
+        )
+        qs = Labelled.objects.filter(attrs__int__f3__isnull=True,
+                                     name__in=['a', 'b']).order_by('name')
+        assert self.names(qs) == ['a', 'b']
+        assert not Labelled.objects.filter(
+            name='a', attrs__date__f4__isnull=False
+        ).exists()
+
+
+class TypedDateTransformTest(TestCase):
+    def setUp(self):
+        self.fixtures, self.schemata = create_fixtures()
+
+    def test_date_range(self):
+        qs = Party.objects.filter(
+            attrs__date__dob__range=(date(1975, 1, 1), date(1975, 12, 31))
+        )
+        assert qs.count() == 5
+        assert not Party.objects.filter(
+            attrs__date__dob__gt=date(1976, 1, 1)
+        ).exists()
+
+    def test_immutable_functions(self):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT proname, provolatile FROM pg_proc "
+                "WHERE proname LIKE 'jsonattrs_%%' ORDER BY proname"
+            )
+            assert cursor.fetchall() == [
+                ('jsonattrs_bool', 'i'), ('jsonattrs_date', 'i'),
+                ('jsonattrs_float', 'i'), ('jsonattrs_int', 'i'),
+                ('jsonattrs_make_date', 'i'), ('jsonattrs_numeric', 'i'),
+                ('jsonattrs_timestamp', 'i'), ('jsonattrs_utc_offset', 'i'),
+            ]
+
+    def test_inlined_functions(self):
+        for cast in ('int', 'dec', 'bool', 'date', 'datetime'):
+            qs = Party.objects.filter(**{
+                'attrs__{}__dob__isnull'.format(cast): False
+            })
+            sql, params = qs.query.sql_with_params()
+            with connection.cursor() as cursor:
+                cursor.execute('EXPLAIN VERBOSE ' + sql, params)
+                plan = '\n'.join(row[0] for row in cursor.fetchall())
+            assert 'jsonattrs_' not in plan, cast
+
+    def test_iso_parsing(self):
+        values = [
+            ('date', '2017-01-12', date(2017, 1, 12)),
+            ('date', '2017-01-12T13:06:11', date(2017, 1, 12)),
+            ('date', '12/01/2017', None),
+            ('date', '2017-02-30', None),
+            ('date', '2016-02-29', date(2016, 2, 29)),
+            ('date', '0000-01-01', None),
+            ('datetime', '2017-01-12', datetime(2017, 1, 12)),
+            ('datetime', '2017-01-12T13:06:11.5',
+             datetime(2017, 1, 12, 13, 6, 11, 500000)),
+            ('datetime', '2017-01-12T13:06:11+00:00',
+             datetime(2017, 1, 12, 13, 6, 11)),
+            ('datetime', '2017-01-12T13:06Z', datetime(2017, 1, 12, 13, 6)),
+            ('datetime', '2017-01-12 13:06:11+05:30',
+             datetime(2017, 1, 12, 7, 36, 11)),
+            ('datetime', '2017-01-12T01:00:00-0200',
+             datetime(2017, 1, 12, 3, 0)),
+            ('datetime', 'tomorrow', None),
+            ('datetime', '2017-01-12T25:00:00', None),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL DateStyle = 'ISO, DMY'")
+            cursor.execute("SET LOCAL TimeZone = 'America/Lima'")
+            for cast, text, expected in values:
+                cursor.execute('SELECT ' + TYPED_CASTS[cast].template.format(
+                    '%s'
+                ), [text])
+                assert cursor.fetchone()[0] == expected, text
+
+
+def test_attribute_type_cast():
+    assert attribute_type_cast('integer') == 'int'
+    assert attribute_type_cast('dateTime') == 'datetime'
+    assert attribute_type_cast('select_one') == 'text'
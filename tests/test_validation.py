@@ -1,7 +1,11 @@
 import pytest
+from decimal import Decimal
+from unittest.mock import patch
 from django.test import TestCase
 from django.core.exceptions import ValidationError
-from jsonattrs.models import Schema, Attribute, AttributeType
+from jsonattrs.models import (
+    Schema, Attribute, AttributeType, find_class, register_validator_type
+)
 
 from .fixtures import create_fixtures
 
@@ -119,3 +123,71 @@ class ValidationTest(TestCase):
             attr.validate('')
         with pytest.raises(ValidationError):
             attr.validate([''])
+
+    def test_compiled_validator(self):
+        attr = Attribute.objects.create(
+            schema=self.schema,
+            name='testattr',
+            long_name='Test attribute',
+            index=1,
+            attr_type=AttributeType.objects.get(name='boolean')
+        )
+        attr = Attribute.objects.get(pk=attr.pk)
+
+        # Compiling resolves the attribute type once, up front.
+        validate = attr.compile_validator()
+        with self.assertNumQueries(0):
+            validate('true')
+            validate(False)
+            with pytest.raises(ValidationError) as exc_info:
+                validate('maybe')
+            assert exc_info.value.messages == [
+                'Validation failed for testattr: "maybe"'
+            ]
+            with pytest.raises(ValidationError) as exc_info:
+                validate(3)
+            assert exc_info.value.messages == [
+                'Validation failed for testattr: "3"'
+            ]
+
+    def test_compiled_validator_unhashable_choice(self):
+        attr = Attribute.objects.create(
+            schema=self.schema,
+            name='testattr',
+            long_name='Test attribute',
+            index=1,
+            attr_type=AttributeType.objects.get(name='select_multiple'),
+            choices=['a', 'b', 'c']
+        )
+        validate = attr.compile_validator()
+        validate(['a', 'c'])
+        with pytest.raises(ValidationError) as exc_info:
+            validate(['a', {'b': 1}])
+        assert exc_info.value.messages == [
+            'Invalid choice for testattr: "{\'b\': 1}"'
+        ]
+
+
+class Point:
+    pass
+
+
+def test_find_class_builtin():
+    assert find_class('bool') is bool
+    assert find_class('Decimal') is Decimal
+
+
+def test_find_class_unknown():
+    with pytest.raises(ValueError) as exc_info:
+        find_class('Point')
+    assert str(exc_info.value) == "Unknown validator type: 'Point'"
+
+
+@patch.dict('jsonattrs.models.VALIDATOR_TYPES')
+def test_register_validator_type():
+    register_validator_type('Point', Point)
+    register_validator_type('Point', Point)
+    assert find_class('Point') is Point
+    with pytest.raises(ValueError):
+        register_validator_type('Point', dict)
+    assert find_class('Point') is Point
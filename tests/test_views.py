@@ -0,0 +1,120 @@
+from datetime import date
+from io import StringIO
+
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from jsonattrs.models import Attribute, AttributeType, Schema
+from jsonattrs.views import existing_views, schema_view, sync_views
+
+from .fixtures import create_labelled_schemata
+from .models import Labelled
+
+
+def query(sql):
+    with connection.cursor() as cursor:
+        cursor.execute(sql)
+        columns = [c[0] for c in cursor.description]
+        return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+class SchemaViewTest(TestCase):
+    def setUp(self):
+        create_labelled_schemata()
+        self.schema = schema = Schema.objects.get(
+            content_type=ContentType.objects.get_for_model(Labelled),
+            selectors=['initial']
+        )
+        self.view = schema_view(schema).name
+        Attribute.objects.create(
+            schema=schema, name='surveyed', long_name='Surveyed', index=10,
+            attr_type=AttributeType.objects.get(name='date')
+        )
+        Labelled.objects.create(name='a', label='initial',
+                                attrs={'f2': 'x', 'f3': 5,
+                                       'surveyed': '2017-03-01'})
+        Labelled.objects.create(name='b', label='other', attrs={})
+        Labelled.objects.filter(name='b').update(
+            label='initial', attrs={'f2': 'y', 'f3': 'many'}
+        )
+
+    def test_view(self):
+        result = sync_views()
+        assert self.view in result.created
+        assert result.refreshed == [] and result.dropped == []
+        rows = query('SELECT * FROM {} ORDER BY name'.format(self.view))
+        assert rows[0]['f3'] == 5
+        assert rows[0]['surveyed'] == date(2017, 3, 1)
+        assert rows[0]['f2'] == 'x' and rows[0]['label'] == 'initial'
+        assert rows[1]['f3'] is None and rows[1]['surveyed'] is None
+        assert 'f1' in rows[0] and 'attrs' not in rows[0]
+
+        assert sync_views() == ([], [], [])
+
+    def test_changed_schema(self):
+        sync_views()
+        Attribute.objects.filter(name='surveyed').delete()
+        result = sync_views()
+        assert result.created == result.dropped == [self.view]
+        rows = query('SELECT * FROM {}'.format(self.view))
+        assert 'surveyed' not in rows[0]
+
+    def test_materialized(self):
+        sync_views()
+        result = sync_views(materialized=True)
+        assert result.created == result.dropped
+        assert all(mat for mat, _ in existing_views().values())
+        Labelled.objects.create(name='c', label='initial', attrs={'f2': 'z'})
+        result = sync_views(materialized=True, concurrently=True)
+        assert result.created == []
+        assert self.view in result.refreshed
+        rows = query('SELECT name FROM {}'.format(self.view))
+        assert len(rows) == 3
+
+    def test_command(self):
+        out = StringIO()
+        call_command('syncattrviews', '--dry-run', stdout=out)
+        assert 'Would create view ' + self.view in out.getvalue()
+        assert existing_views() == {}
+        out = StringIO()
+        call_command('syncattrviews', stdout=out)
+        assert 'Created view ' + self.view in out.getvalue()
+
+    def test_invalid_values(self):
+        Labelled.objects.filter(name='b').update(attrs={
+            'f2': 'y', 'f3': '99999999999999999999', 'surveyed': '2017-02-30'
+        })
+        sync_views()
+        rows = query('SELECT * FROM {} WHERE name = {}'.format(
+            self.view, "'b'"
+        ))
+        assert rows[0]['f3'] is None and rows[0]['surveyed'] is None
+
+    def test_view_names(self):
+        content_type = self.schema.content_type
+        names = {schema_view(Schema.objects.create(
+            content_type=content_type, selectors=selectors
+        )).name for selectors in (['a.b'], ['a_b'], ['A_b'])}
+        assert len(names) == 3
+        assert all(len(name) <= 60 for name in names)
+
+    def test_schema_without_rows(self):
+        Schema.objects.create(content_type=self.schema.content_type,
+                              selectors=['initial', 'extra'])
+        assert len(sync_views().created) == len(
+            Schema.objects.filter(content_type=self.schema.content_type,
+                                  selectors__len=1)
+        )
+
+    def test_long_attribute_names(self):
+        text_type = AttributeType.objects.get(name='text')
+        for i in range(2):
+            Attribute.objects.create(
+                schema=self.schema, name='x' * 70 + str(i), index=20 + i,
+                long_name='Long', attr_type=text_type
+            )
+        sync_views()
+        columns = query('SELECT * FROM {}'.format(self.view))[0]
+        assert len([c for c in columns if c.startswith('xxx')]) == 2